@@ -1,6 +1,4 @@
 from django.apps import AppConfig
-from django.conf import settings
-from django.core.exceptions import ImproperlyConfigured
 
 
 class BookingAppConfig(AppConfig):
@@ -8,15 +6,9 @@ class BookingAppConfig(AppConfig):
     name = 'booking_app'
 
     def ready(self):
-        # This code runs once when the Django server starts.
-        # We only perform this strict check in production (when DEBUG=False).
         import booking_app.signals
 
-        if not settings.DEBUG:
-            # We import here to avoid issues during startup.
-            from .utils.get_license_status import is_license_valid
-
-            if not is_license_valid():
-                raise ImproperlyConfigured(
-                    "License validation failed. The application cannot start."
-                )
\ No newline at end of file
+        # No license check here: ready() also runs for migrate, collectstatic and the
+        # Celery worker/beat, and must not need Redis or the license server. The
+        # license is enforced per request by LicenseCheckMiddleware and kept fresh by
+        # the 'refresh-license-status' periodic job.
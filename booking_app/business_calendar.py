@@ -0,0 +1,166 @@
+# booking_app/business_calendar.py
+
+from bisect import bisect_right
+from datetime import date, timedelta
+
+from django.conf import settings
+
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def portuguese_holidays(year):
+    """National public holidays in Portugal for `year`."""
+    easter = easter_sunday(year)
+    return [
+        date(year, 1, 1),               # Ano Novo
+        easter - timedelta(days=2),     # Sexta-feira Santa
+        easter,                         # Páscoa
+        date(year, 4, 25),              # Dia da Liberdade
+        date(year, 5, 1),               # Dia do Trabalhador
+        easter + timedelta(days=60),    # Corpo de Deus
+        date(year, 6, 10),              # Dia de Portugal
+        date(year, 8, 15),              # Assunção de Nossa Senhora
+        date(year, 10, 5),              # Implantação da República
+        date(year, 11, 1),              # Todos os Santos
+        date(year, 12, 1),              # Restauração da Independência
+        date(year, 12, 8),              # Imaculada Conceição
+        date(year, 12, 25),             # Natal
+    ]
+
+
+NATIONAL_HOLIDAYS = {
+    'PT': portuguese_holidays,
+}
+
+
+def _shift_weekdays(day, n):
+    """Move `day` forward (n > 0) or backward (n < 0) by n weekdays, in O(1)."""
+    if n == 0:
+        return day
+    weekday = day.weekday()
+    weeks, rem = divmod(abs(n), 5)
+    days = weeks * 7 + rem
+    if n > 0:
+        if weekday >= 5:  # a weekend start behaves like the Friday before it
+            day -= timedelta(days=weekday - 4)
+            weekday = 4
+        if weekday + rem >= 5:
+            days += 2
+        return day + timedelta(days=days)
+    if weekday >= 5:  # a weekend start behaves like the Monday after it
+        day += timedelta(days=7 - weekday)
+        weekday = 0
+    if weekday - rem < 0:
+        days += 2
+    return day - timedelta(days=days)
+
+
+class BusinessCalendar:
+    """
+    Business-day arithmetic over Monday-Friday minus a holiday list.
+
+    Weekends are skipped with a closed-form weekday formula; holidays are kept as a
+    sorted table of weekday ordinals and counted with binary search, so a shift costs
+    O(log H) whatever the number of days moved.
+    """
+
+    def __init__(self, holidays=()):
+        self.holidays = frozenset(holidays)
+        self._ordinals = sorted({d.toordinal() for d in self.holidays if d.weekday() < 5})
+
+    @classmethod
+    def from_settings(cls, first_year=None, last_year=None):
+        """
+        Build the calendar from BUSINESS_CALENDAR_COUNTRY (national holidays) and
+        BUSINESS_CALENDAR_EXTRA_HOLIDAYS (company closing days, dates or ISO strings).
+        """
+        today = date.today()
+        first_year = first_year or today.year - 10
+        last_year = last_year or today.year + 30
+
+        holidays = set()
+        country = getattr(settings, 'BUSINESS_CALENDAR_COUNTRY', None)
+        national = NATIONAL_HOLIDAYS.get(country)
+        if national:
+            for year in range(first_year, last_year + 1):
+                holidays.update(national(year))
+
+        for extra in getattr(settings, 'BUSINESS_CALENDAR_EXTRA_HOLIDAYS', []):
+            holidays.add(extra if isinstance(extra, date) else date.fromisoformat(extra))
+
+        return cls(holidays)
+
+    def is_business_day(self, day):
+        return day.weekday() < 5 and day not in self.holidays
+
+    def _holidays_between(self, low, high):
+        """Number of weekday holidays with low < ordinal <= high."""
+        return bisect_right(self._ordinals, high) - bisect_right(self._ordinals, low)
+
+    def add(self, start_date, num_business_days):
+        """The date `num_business_days` business days after `start_date`."""
+        if num_business_days <= 0:
+            return self.subtract(start_date, -num_business_days) if num_business_days else start_date
+
+        result = _shift_weekdays(start_date, num_business_days)
+        low = start_date.toordinal()
+        missing = self._holidays_between(low, result.toordinal())
+        while missing:
+            low = result.toordinal()
+            result = _shift_weekdays(result, missing)
+            missing = self._holidays_between(low, result.toordinal())
+        return result
+
+    def subtract(self, from_date, num_business_days):
+        """The date `num_business_days` business days before `from_date`."""
+        if num_business_days <= 0:
+            return self.add(from_date, -num_business_days) if num_business_days else from_date
+
+        result = _shift_weekdays(from_date, -num_business_days)
+        high = from_date.toordinal() - 1
+        missing = self._holidays_between(result.toordinal() - 1, high)
+        while missing:
+            high = result.toordinal() - 1
+            result = _shift_weekdays(result, -missing)
+            missing = self._holidays_between(result.toordinal() - 1, high)
+        return result
+
+    def add_many(self, dates, num_business_days):
+        """Shift a whole sequence of dates forward; repeated dates are computed once."""
+        shifted = {d: self.add(d, num_business_days) for d in set(dates)}
+        return [shifted[d] for d in dates]
+
+    def subtract_many(self, dates, num_business_days):
+        """Shift a whole sequence of dates backward; repeated dates are computed once."""
+        shifted = {d: self.subtract(d, num_business_days) for d in set(dates)}
+        return [shifted[d] for d in dates]
+
+
+_calendar = None
+
+
+def get_business_calendar():
+    """The process-wide calendar built from settings (created on first use)."""
+    global _calendar
+    if _calendar is None:
+        _calendar = BusinessCalendar.from_settings()
+    return _calendar
+
+
+def reset_business_calendar():
+    """Drop the cached calendar so the next call re-reads the holiday settings."""
+    global _calendar
+    _calendar = None
@@ -0,0 +1,122 @@
+# booking_app/cache.py
+"""
+Namespaced access to the shared (Redis) cache.
+
+Each domain gets a CacheNamespace; its keys are stored as
+"<namespace>:<generation>:<key>". invalidate() bumps the namespace's generation
+counter, which drops every key of the namespace at once on all nodes (the old
+entries simply age out). Hits and misses are counted per namespace in each
+process, see cache_stats().
+"""
+
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+DEFAULT_TIMEOUT = 60 * 60
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class CacheNamespace:
+    def __init__(self, name, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        self.generation_key = f"{name}:generation"
+        with _stats_lock:
+            _stats.setdefault(name, {'hits': 0, 'misses': 0})
+
+    def __repr__(self):
+        return f"<CacheNamespace {self.name}>"
+
+    def _count(self, hits, misses):
+        with _stats_lock:
+            _stats[self.name]['hits'] += hits
+            _stats[self.name]['misses'] += misses
+
+    def generation(self):
+        generation = cache.get(self.generation_key)
+        if generation is None:
+            # A time-based start keeps an evicted counter from reusing old generations.
+            cache.add(self.generation_key, int(time.time() * 1000), None)
+            generation = cache.get(self.generation_key)
+        return generation
+
+    def invalidate(self):
+        """Drop every key of the namespace."""
+        try:
+            cache.incr(self.generation_key)
+        except ValueError:
+            cache.set(self.generation_key, int(time.time() * 1000), None)
+
+    def invalidate_on_commit(self):
+        """
+        invalidate() once the current transaction commits (at once outside one).
+        Invalidating earlier would let a concurrent reader cache pre-commit data
+        under the new generation.
+        """
+        transaction.on_commit(self.invalidate)
+
+    def _keys(self, keys):
+        generation = self.generation()
+        return {key: f"{self.name}:{generation}:{key}" for key in keys}
+
+    def get(self, key, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def get_many(self, keys):
+        """{key: value} of the keys found, in one cache round trip (plus the generation read)."""
+        full_keys = self._keys(keys)
+        found = cache.get_many(list(full_keys.values()))
+        values = {key: found[full] for key, full in full_keys.items() if full in found}
+        self._count(len(values), len(full_keys) - len(values))
+        return values
+
+    def set(self, key, value, timeout=None):
+        self.set_many({key: value}, timeout)
+
+    def set_many(self, mapping, timeout=None):
+        full_keys = self._keys(mapping)
+        cache.set_many(
+            {full_keys[key]: value for key, value in mapping.items()},
+            self.timeout if timeout is None else timeout,
+        )
+
+    def add(self, key, value, timeout=None):
+        """Set `key` only if it is absent; returns whether it was set (usable as a lock)."""
+        return cache.add(self._keys([key])[key], value, self.timeout if timeout is None else timeout)
+
+    def delete(self, key):
+        self.delete_many([key])
+
+    def delete_many(self, keys):
+        cache.delete_many(list(self._keys(keys).values()))
+
+    def get_or_set(self, key, default, timeout=None):
+        """Cached value of `key`, computing and storing default() on a miss."""
+        values = self.get_many([key])
+        if key in values:
+            return values[key]
+        value = default()
+        self.set(key, value, timeout)
+        return value
+
+
+def cache_stats():
+    """{namespace: {'hits', 'misses'}} for this process."""
+    with _stats_lock:
+        return {name: dict(counts) for name, counts in _stats.items()}
+
+
+# --- Namespaces of the app ---
+
+vehicles_cache = CacheNamespace('vehicles', timeout=60 * 60 * 48)
+bookings_cache = CacheNamespace('bookings')
+templates_cache = CacheNamespace('templates', timeout=60 * 60 * 24)
+roles_cache = CacheNamespace('roles')
+presence_cache = CacheNamespace('presence', timeout=30)
+settings_cache = CacheNamespace('settings', timeout=60 * 60 * 24)
+external_cache = CacheNamespace('external', timeout=None)
@@ -11,16 +11,9 @@ def auth_extras(request):
 
     # We can only check groups for an authenticated user
     if request.user.is_authenticated:
-        # Assuming 'is_admin_member' is a custom property or method on your user model.
-        # This checks for it safely.
-        is_admin = getattr(request.user, 'is_admin_member', False)
-
-        # If is_admin_member is a method, call it.
-        if callable(is_admin):
-            is_admin = is_admin()
-
-        # Check if the user is an admin or in one of the specified groups
-        if is_admin or request.user.groups.filter(name__in=['sd', 'tllight', 'tlheavy']).exists():
+        # group_names is loaded once per request and shared with the role properties.
+        user = request.user
+        if user.is_admin_member or user.group_names & {'sd', 'tllight', 'tlheavy'}:
             can_view_group_bookings = True
 
     return {
@@ -22,7 +22,6 @@ from .models import (
     AutomationSettings,
     Client,
 )
-from .utils import subtract_business_days, add_business_days
 
 # Re-assign User model for clarity
 User = get_user_model()
@@ -139,27 +138,12 @@ class BookingForm(forms.ModelForm):
             raise ValidationError(_("End date must be after start date."))
 
         if self.vehicle and start_date and end_date:
-            unavailable_statuses = ['pending', 'pending_contract', 'confirmed', 'pending_final_km']
-            new_booking_start_buffer = subtract_business_days(start_date, 3)
-            new_booking_end_buffer = add_business_days(end_date, 3)
-            conflicting_bookings = Booking.objects.filter(
-                vehicle=self.vehicle,
-                status__in=unavailable_statuses,
-                start_date__lte=new_booking_end_buffer,
-                end_date__gte=new_booking_start_buffer
-            )
+            conflicting_bookings = Booking.objects.overlapping(self.vehicle, start_date, end_date)
             if self.instance and self.instance.pk:
                 conflicting_bookings = conflicting_bookings.exclude(pk=self.instance.pk)
-            if conflicting_bookings.exists():
-                conflict = conflicting_bookings.first()
-                raise ValidationError(
-                    _("The selected date range conflicts with an existing booking "
-                      "(ID: %(booking_id)s) for this vehicle from %(start)s to %(end)s.") % {
-                        'booking_id': conflict.pk,
-                        'start': conflict.start_date.strftime('%Y-%m-%d'),
-                        'end': conflict.end_date.strftime('%Y-%m-%d'),
-                    }
-                )
+            conflict = conflicting_bookings.first()
+            if conflict:
+                raise self.conflict_error(conflict)
 
         if self.vehicle and self.vehicle.vehicle_type == 'APV' and not motive and not self.instance.pk:
             self.add_error('motive', _("This field is required for APV bookings."))
@@ -174,6 +158,19 @@ class BookingForm(forms.ModelForm):
                 )
         return cleaned_data
 
+    def conflict_error(self, conflict):
+        """The user-facing error for a clash with the existing booking `conflict` (may be None)."""
+        if conflict is None:
+            return ValidationError(_("The selected date range conflicts with an existing booking for this vehicle."))
+        return ValidationError(
+            _("The selected date range conflicts with an existing booking "
+              "(ID: %(booking_id)s) for this vehicle from %(start)s to %(end)s.") % {
+                'booking_id': conflict.pk,
+                'start': conflict.start_date.strftime('%Y-%m-%d'),
+                'end': conflict.end_date.strftime('%Y-%m-%d'),
+            }
+        )
+
     @transaction.atomic
     def save(self, commit=True):
         booking = super().save(commit=False)
@@ -0,0 +1,153 @@
+# booking_app/graph.py
+
+import logging
+import threading
+import time
+
+import msal
+import requests
+from django.conf import settings
+from .cache import external_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('booking_app')
+
+GRAPH_SCOPES = ["https://graph.microsoft.com/.default"]
+GRAPH_BASE_URL = "https://graph.microsoft.com/v1.0"
+
+# Graph accepts at most 20 requests in one JSON $batch call.
+GRAPH_BATCH_LIMIT = 20
+
+# (connect, read) timeouts in seconds for every Graph call.
+GRAPH_TIMEOUT = (5, 30)
+
+# A token is replaced this many seconds before it expires (MSAL uses the same skew).
+TOKEN_REFRESH_MARGIN = 300
+
+
+class GraphTokenProvider:
+    """
+    App-only access tokens for Microsoft Graph.
+
+    One MSAL client, and with it MSAL's in-memory token cache, lives for the whole
+    process. The current token is also published in the Django cache so every
+    worker reuses it instead of asking AAD for its own.
+    """
+
+    def __init__(self, tenant_id, client_id, client_secret, shared_cache=True):
+        self.tenant_id = tenant_id
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.shared_cache = shared_cache
+        self.cache_key = f"ms_graph_token:{tenant_id}:{client_id}"
+        self._app = None
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(
+            tenant_id=settings.MS_GRAPH_TENANT_ID,
+            client_id=settings.MS_GRAPH_CLIENT_ID,
+            client_secret=settings.MS_GRAPH_CLIENT_SECRET,
+            shared_cache=getattr(settings, 'MS_GRAPH_SHARED_TOKEN_CACHE', True),
+        )
+
+    @staticmethod
+    def _is_fresh(expires_at):
+        return expires_at - TOKEN_REFRESH_MARGIN > time.time()
+
+    def get_token(self):
+        """A valid access token, or None if AAD refused to issue one."""
+        if self._token and self._is_fresh(self._expires_at):
+            return self._token
+
+        with self._lock:
+            if self._token and self._is_fresh(self._expires_at):
+                return self._token
+            if self.shared_cache:
+                shared = external_cache.get(self.cache_key)
+                if shared and self._is_fresh(shared[1]):
+                    self._token, self._expires_at = shared
+                    return self._token
+            return self._acquire()
+
+    def _acquire(self):
+        if self._app is None:
+            self._app = msal.ConfidentialClientApplication(
+                client_id=self.client_id,
+                authority=f"https://login.microsoftonline.com/{self.tenant_id}",
+                client_credential=self.client_secret,
+            )
+
+        result = self._app.acquire_token_for_client(scopes=GRAPH_SCOPES)
+        if "access_token" not in result:
+            error_description = result.get("error_description", "No error description from MSAL.")
+            logger.error(f"Failed to acquire token: {error_description}")
+            return None
+
+        if result.get("token_source") != "cache":
+            logger.info("Acquired a new Microsoft Graph token from AAD.")
+        self._token = result["access_token"]
+        self._expires_at = time.time() + int(result.get("expires_in", 0))
+        if self.shared_cache:
+            timeout = int(self._expires_at - time.time()) - TOKEN_REFRESH_MARGIN
+            if timeout > 0:
+                external_cache.set(self.cache_key, (self._token, self._expires_at), timeout)
+        return self._token
+
+    def invalidate(self):
+        """Drop the current token everywhere, e.g. after Graph rejected it with 401."""
+        with self._lock:
+            self._app = None
+            self._token = None
+            self._expires_at = 0
+            if self.shared_cache:
+                external_cache.delete(self.cache_key)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_token_provider():
+    """The process-wide token provider (created on first use)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = GraphTokenProvider.from_settings()
+    return _provider
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    The process-wide keep-alive session used for Graph calls.
+
+    Only throttling answers (429/503, honouring Retry-After) and connection
+    failures are retried: in both cases Graph has not accepted the message, so a
+    retry cannot send it twice.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=3, connect=3, read=0, status=3,
+                    backoff_factor=1,
+                    status_forcelist=(429, 503),
+                    allowed_methods=frozenset({'GET', 'POST'}),
+                    respect_retry_after_header=True,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                _session = session
+    return _session
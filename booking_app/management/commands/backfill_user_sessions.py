@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from booking_app.session_registry import backfill_session_registry
+
+
+class Command(BaseCommand):
+    help = "Register the live sessions created before the UserSession registry existed (run once after deploying it)"
+
+    def handle(self, *args, **options):
+        count = backfill_session_registry()
+        self.stdout.write(self.style.SUCCESS(f"Registered {count} sessions"))
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext as _
+
+from booking_app.models import Booking
+from booking_app.sweeps import bulk_update_booking_status
+
+
+class Command(BaseCommand):
+    help = ("One-off cleanup: cancel the pending bookings that started before the given date, "
+            "without sending any notification (check_pending_bookings only handles recent ones).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat, default=None,
+                            help='Cancel pending bookings starting before this date (YYYY-MM-DD, default: tomorrow).')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the bookings.')
+
+    def handle(self, *args, **options):
+        before = options['before'] or date.today() + timedelta(days=1)
+        stale = Booking.objects.filter(status='pending', start_date__lt=before)
+
+        if options['dry_run']:
+            self.stdout.write(f"{stale.count()} pending bookings start before {before}.")
+            return
+
+        cancelled_ids = bulk_update_booking_status(
+            stale,
+            'cancelled',
+            cancellation_time=timezone.now(),
+            cancellation_reason=_("Automatically cancelled due to non-approval before start date."),
+        )
+        self.stdout.write(self.style.WARNING(f"Cancelled {len(cancelled_ids)} stale pending bookings (not notified)."))
@@ -1,7 +1,10 @@
 from django.core.management.base import BaseCommand
 from datetime import date, timedelta
 from booking_app.models import Booking, AutomationSettings
-from booking_app.utils import send_system_notification
+from booking_app.periodic import last_succeeded_date
+from booking_app.sweeps import (
+    SWEEP_CHUNK_SIZE, SWEEP_MODES, SWEEP_WORKERS, bulk_update_booking_status, fan_out_booking_notifications,
+)
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
@@ -9,6 +12,13 @@ from django.utils.translation import gettext as _
 class Command(BaseCommand):
     help = 'Checks for pending bookings to send reminders or cancel them.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=SWEEP_MODES, default='threads',
+                            help='Run the notifications on a thread pool, as a Celery group, or inline.')
+        parser.add_argument('--workers', type=int, default=SWEEP_WORKERS,
+                            help='Maximum number of chunks processed at once in threads mode.')
+        parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE)
+
     def handle(self, *args, **options):
         settings = AutomationSettings.load()
         if not settings.pending_booking_automation_active:
@@ -17,26 +27,45 @@ class Command(BaseCommand):
 
         self.stdout.write('Checking pending bookings...')
         today = date.today()
+        cancellation_date = today + timedelta(days=1)
 
         # --- Handle 7-Day Reminders ---
+        # Also covers the start dates of the days the job did not run (but not the ones
+        # about to be cancelled), and none twice.
         reminder_date = today + timedelta(days=7)
-        bookings_to_remind = Booking.objects.filter(status='pending', start_date=reminder_date)
-
-        for booking in bookings_to_remind:
-            send_system_notification('booking_reminder_7_days', context_data={"booking_instance":booking})
-            self.stdout.write(self.style.SUCCESS(f'Sent 7-day reminder for Booking ID: {booking.pk}'))
+        last_run = last_succeeded_date('check-pending-bookings')
+        reminded_until = max(last_run + timedelta(days=7) if last_run else reminder_date - timedelta(days=1),
+                             cancellation_date)
+        reminder_ids = list(
+            Booking.objects.filter(status='pending', start_date__gt=reminded_until, start_date__lte=reminder_date)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        self.notify('booking_reminder_7_days', reminder_ids, options)
+        self.stdout.write(self.style.SUCCESS(f'Sent 7-day reminders for {len(reminder_ids)} bookings'))
 
         # --- Handle Cancellations for Tomorrow's Bookings ---
-        cancellation_date = today + timedelta(days=1)
-        bookings_to_cancel = Booking.objects.filter(status='pending', start_date=cancellation_date)
-
-        for booking in bookings_to_cancel:
-            send_system_notification('booking_auto_cancelled', context_data={"booking_instance":booking})
-            booking.status = 'cancelled'
-            booking.cancellation_time = timezone.now()
-            booking.cancellation_reason = _(
-                "Automatically cancelled due to non-approval before start date.")  # Set a reason
-            booking.save()
-            self.stdout.write(self.style.WARNING(f'Auto-cancelled Booking ID: {booking.pk}'))
-
-        self.stdout.write(self.style.SUCCESS('Pending booking check complete.'))
\ No newline at end of file
+        # Plus those of the days the job did not run since its last success; older
+        # pending bookings are left to cancel_stale_pending_bookings (no emails).
+        cancelled_until = last_run + timedelta(days=1) if last_run else cancellation_date - timedelta(days=1)
+        cancelled_ids = bulk_update_booking_status(
+            Booking.objects.filter(status='pending', start_date__gt=cancelled_until,
+                                   start_date__lte=cancellation_date),
+            'cancelled',
+            cancellation_time=timezone.now(),
+            cancellation_reason=_("Automatically cancelled due to non-approval before start date."),
+        )
+        self.stdout.write(self.style.WARNING(f'Auto-cancelled {len(cancelled_ids)} bookings'))
+        self.notify('booking_auto_cancelled', cancelled_ids, options)
+
+        self.stdout.write(self.style.SUCCESS('Pending booking check complete.'))
+
+    def notify(self, event_trigger, booking_ids, options):
+        def progress(done, total, sent, failed):
+            self.stdout.write(f"  {event_trigger}: chunk {done}/{total} ({sent} queued, {failed} failed)")
+
+        sent, failed = fan_out_booking_notifications(
+            event_trigger, booking_ids, mode=options['mode'], workers=options['workers'],
+            chunk_size=options['chunk_size'], progress=progress,
+        )
+        if failed:
+            self.stdout.write(self.style.ERROR(f"{failed} '{event_trigger}' notifications failed, see the log."))
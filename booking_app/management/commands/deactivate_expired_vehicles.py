@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from booking_app.models import Vehicle
 from booking_app.utils import send_system_notification
 from datetime import date
@@ -13,17 +14,19 @@ class Command(BaseCommand):
         # Capture list before update
         expired_vehicles = list(expired_qs)
 
-        count = expired_qs.update(active_status=False, is_available=False)
-        self.stdout.write(self.style.SUCCESS(f"{count} vehicles deactivated"))
+        # The notification is queued in the same transaction as the deactivation.
+        with transaction.atomic():
+            count = expired_qs.update(active_status=False, is_available=False)
 
-        if count > 0:
-            # Prepare context for email templates
-            context_data = {
-                "date": today,
-                "vehicles": expired_vehicles,  # pass queryset list for looping in template
-            }
+            if count > 0:
+                # Prepare context for email templates
+                context_data = {
+                    "date": today,
+                    "vehicles": expired_vehicles,  # pass queryset list for looping in template
+                }
 
-            send_system_notification(
-                event_trigger="vehicles_deactivated_auto",
-                context_data=context_data
-            )
+                send_system_notification(
+                    event_trigger="vehicles_deactivated_auto",
+                    context_data=context_data
+                )
+        self.stdout.write(self.style.SUCCESS(f"{count} vehicles deactivated"))
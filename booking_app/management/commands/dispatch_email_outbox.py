@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from booking_app.graph import GRAPH_BATCH_LIMIT
+from booking_app.outbox import dispatch_email_outbox, retry_dead_messages
+
+class Command(BaseCommand):
+    help = "Send the due messages of the email outbox (safe to run in several processes at once)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=GRAPH_BATCH_LIMIT)
+        parser.add_argument('--max-batches', type=int, default=None)
+        parser.add_argument('--retry-dead', action='store_true',
+                            help="Requeue dead-lettered messages before dispatching")
+
+    def handle(self, *args, **options):
+        if options['retry_dead']:
+            requeued = retry_dead_messages()
+            self.stdout.write(f"Requeued {requeued} dead-lettered messages")
+
+        processed = dispatch_email_outbox(batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} outbox messages"))
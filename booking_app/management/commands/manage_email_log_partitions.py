@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from booking_app.partitions import (
+    archive_expired_email_log_partitions,
+    convert_email_log_to_partitions,
+    ensure_email_log_partitions,
+    is_partitioned,
+)
+
+class Command(BaseCommand):
+    help = "Create upcoming monthly EmailLog partitions and archive the expired ones (--convert partitions the table first)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help="Convert the plain EmailLog table into a partitioned one (one-off, copies all rows)")
+        parser.add_argument('--months-ahead', type=int, default=None)
+        parser.add_argument('--retention-months', type=int, default=None)
+        parser.add_argument('--archive-dir', default=None)
+
+    def handle(self, *args, **options):
+        if options['convert']:
+            if convert_email_log_to_partitions(options['months_ahead']):
+                self.stdout.write(self.style.SUCCESS("EmailLog converted to monthly partitions"))
+            else:
+                self.stdout.write("EmailLog is already partitioned")
+
+        if not is_partitioned():
+            raise CommandError("EmailLog is not partitioned; run with --convert first.")
+
+        for name in ensure_email_log_partitions(options['months_ahead']):
+            self.stdout.write(f"Created partition {name}")
+
+        archived = archive_expired_email_log_partitions(options['retention_months'], options['archive_dir'])
+        for name, count in archived:
+            self.stdout.write(f"Archived and dropped {name} ({count} rows)")
+        self.stdout.write(self.style.SUCCESS(f"{len(archived)} partitions archived"))
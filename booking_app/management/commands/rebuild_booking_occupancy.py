@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from booking_app.models import Booking
+
+class Command(BaseCommand):
+    help = "Recompute the buffered occupancy range stored on every booking"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        qs = Booking.objects.only("id", "start_date", "end_date", "occupancy").order_by("pk")
+        batch, count, conflicts = [], 0, []
+
+        for b in qs.iterator(chunk_size=batch_size):
+            b.occupancy = Booking.occupancy_range(b.start_date, b.end_date)
+            batch.append(b)
+            if len(batch) >= batch_size:
+                count += self._flush(batch, conflicts)
+                batch = []
+        if batch:
+            count += self._flush(batch, conflicts)
+
+        self.stdout.write(self.style.SUCCESS(f"Recomputed occupancy for {count} bookings"))
+        for pk in conflicts:
+            self.stdout.write(self.style.WARNING(f"Booking ID {pk} overlaps another active booking; occupancy left empty"))
+
+    def _flush(self, batch, conflicts):
+        try:
+            with transaction.atomic():
+                Booking.objects.bulk_update(batch, ["occupancy"])
+            return len(batch)
+        except IntegrityError:
+            pass
+
+        # Fall back to one row at a time so a single legacy double booking does not block the rest.
+        updated = 0
+        for b in batch:
+            try:
+                with transaction.atomic():
+                    Booking.objects.filter(pk=b.pk).update(occupancy=b.occupancy)
+                updated += 1
+            except IntegrityError:
+                conflicts.append(b.pk)
+        return updated
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from booking_app.models import Vehicle
+from booking_app.occupancy import update_vehicle_row
+
+class Command(BaseCommand):
+    help = "Recompute next_available_date/current_gap_end and the occupancy rows of every vehicle (backfill and daily refresh)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        today = date.today()
+        vehicles = Vehicle.objects.with_availability(today).order_by("pk")
+
+        batch, count = [], 0
+        for v in vehicles.iterator(chunk_size=batch_size):
+            for name, value in v.get_availability_fields(today).items():
+                setattr(v, name, value)
+            update_vehicle_row(v, today)
+            batch.append(v)
+            if len(batch) >= batch_size:
+                Vehicle.objects.bulk_update(batch, ["next_available_date", "current_gap_end"])
+                count += len(batch)
+                batch = []
+        if batch:
+            Vehicle.objects.bulk_update(batch, ["next_available_date", "current_gap_end"])
+            count += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Refreshed availability for {count} vehicles"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from booking_app.periodic import PERIODIC_JOBS, run_periodic_job
+
+
+class Command(BaseCommand):
+    help = "Run a periodic job now (once per period, under its lock), or list the jobs and their last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('job', nargs='?', help='Job name; omit to list the jobs.')
+        parser.add_argument('--force', action='store_true', help='Run even if the job is not due yet today.')
+
+    def handle(self, *args, **options):
+        from booking_app.models import PeriodicJobRun
+
+        name = options['job']
+        if not name:
+            for job in PERIODIC_JOBS.values():
+                last = PeriodicJobRun.objects.filter(job=job.name).order_by('-started_at').first()
+                when = f"{job.every}m" if job.period == 'interval' else f"{job.at:%H:%M}"
+                self.stdout.write(f"{job.name:32} {job.period:8} {when:5}  {last or '-'}")
+            return
+
+        if name not in PERIODIC_JOBS:
+            raise CommandError(f"Unknown periodic job '{name}'")
+
+        run = run_periodic_job(name, force=options['force'])
+        if run is None:
+            self.stdout.write("Nothing to do: not due, already done for this period, or running elsewhere.")
+        elif run.status == 'succeeded':
+            self.stdout.write(run.output)
+            self.stdout.write(self.style.SUCCESS(f"{name} succeeded for {run.period}"))
+        else:
+            self.stdout.write(self.style.ERROR(f"{name} failed for {run.period}:\n{run.error}"))
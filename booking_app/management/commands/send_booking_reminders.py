@@ -5,7 +5,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from datetime import timedelta
 from booking_app.models import AutomationSettings, Booking
-from booking_app.utils import send_system_notification
+from booking_app.sweeps import SWEEP_CHUNK_SIZE, SWEEP_MODES, SWEEP_WORKERS, fan_out_booking_notifications
 
 logger = logging.getLogger('booking_app')
 
@@ -13,42 +13,43 @@ logger = logging.getLogger('booking_app')
 class Command(BaseCommand):
     help = 'Checks for pending bookings that are older than the configured time and sends reminder emails.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=SWEEP_MODES, default='threads',
+                            help='Run the notifications on a thread pool, as a Celery group, or inline.')
+        parser.add_argument('--workers', type=int, default=SWEEP_WORKERS,
+                            help='Maximum number of chunks processed at once in threads mode.')
+        parser.add_argument('--chunk-size', type=int, default=SWEEP_CHUNK_SIZE)
+
     def handle(self, *args, **options):
-        try:
-            settings = AutomationSettings.objects.first()
-            if not settings or not settings.enable_pending_reminders or settings.reminder_days_pending <= 0:
-                self.stdout.write(self.style.SUCCESS('Pending booking reminders are disabled. Exiting.'))
-                return
-        except AutomationSettings.DoesNotExist:
-            self.stdout.write(self.style.WARNING('Automation settings not found. Exiting.'))
+        settings = AutomationSettings.load()
+        if not settings.enable_pending_reminders or settings.reminder_days_pending <= 0:
+            self.stdout.write(self.style.SUCCESS('Pending booking reminders are disabled. Exiting.'))
             return
 
         # Calculate the cutoff date. Any pending booking created on or before this date is overdue.
         cutoff_date = timezone.now() - timedelta(days=settings.reminder_days_pending)
 
         # Find all overdue bookings that are still in 'pending' status.
-        overdue_bookings = Booking.objects.filter(
-            status='pending',
-            created_at__lte=cutoff_date
+        overdue_ids = list(
+            Booking.objects.filter(status='pending', created_at__lte=cutoff_date)
+            .order_by('pk').values_list('pk', flat=True)
         )
 
-        if not overdue_bookings.exists():
+        if not overdue_ids:
             self.stdout.write(self.style.SUCCESS('No overdue pending bookings found.'))
             return
 
-        self.stdout.write(f'Found {overdue_bookings.count()} overdue pending bookings. Sending reminders...')
-
-        sent_count = 0
-        for booking in overdue_bookings:
-            try:
-                # Use your existing notification function with a new event trigger
-                send_system_notification(
-                    event_trigger='booking_pending_reminder',
-                    context_data={"booking_instance":booking}
-                )
-                sent_count += 1
-                logger.info(f"Sent pending reminder for Booking ID: {booking.pk}")
-            except Exception as e:
-                logger.error(f"Failed to send pending reminder for Booking ID: {booking.pk}. Error: {e}")
+        self.stdout.write(f'Found {len(overdue_ids)} overdue pending bookings. Sending reminders...')
+
+        def progress(done, total, sent, failed):
+            self.stdout.write(f'  chunk {done}/{total} ({sent} queued, {failed} failed)')
+
+        sent_count, failed_count = fan_out_booking_notifications(
+            'booking_pending_reminder', overdue_ids, mode=options['mode'], workers=options['workers'],
+            chunk_size=options['chunk_size'], progress=progress,
+        )
+        logger.info(f"Pending reminders: {sent_count} queued, {failed_count} failed")
 
+        if failed_count:
+            self.stdout.write(self.style.WARNING(f'{failed_count} reminders failed, see the log.'))
         self.stdout.write(self.style.SUCCESS(f'Successfully sent {sent_count} reminders.'))
@@ -1,45 +1,18 @@
 # In booking_app/management/commands/update_ended_bookings.py
 
-import logging
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from datetime import timedelta
-from booking_app.models import Booking
-from booking_app.tasks import send_system_notification_task
-
-logger = logging.getLogger('booking_app')
+from booking_app.transitions import TRANSITIONS_BY_NAME, apply_transition
 
 
 class Command(BaseCommand):
-    help = 'Checks for confirmed bookings that ended yesterday and moves them to "Pending Final KM".'
+    help = 'Moves confirmed and ongoing bookings that have ended (including days missed by earlier runs) to "Pending Final KM".'
 
     def handle(self, *args, **options):
-        yesterday = timezone.now().date() - timedelta(days=1)
-
-        # Find all bookings that were 'confirmed' and ended yesterday.
-        ended_bookings = Booking.objects.filter(
-            status='confirmed',
-            end_date=yesterday
-        )
+        booking_ids = apply_transition(TRANSITIONS_BY_NAME['ended'])
 
-        if not ended_bookings.exists():
-            self.stdout.write(self.style.SUCCESS('No bookings ended yesterday. Exiting.'))
+        if not booking_ids:
+            self.stdout.write(self.style.SUCCESS('No ended bookings to update. Exiting.'))
             return
 
-        self.stdout.write(
-            f'Found {ended_bookings.count()} bookings that ended yesterday. Updating status and sending notifications...')
-
-        updated_count = 0
-        for booking in ended_bookings:
-            try:
-                booking.status = 'pending_final_km'
-                booking.save(update_fields=['status'])
-
-                # Send a notification to prompt for final KM entry
-                send_system_notification_task.delay(booking.pk)
-                updated_count += 1
-                logger.info(f"Moved Booking ID {booking.pk} to 'Pending Final KM'.")
-            except Exception as e:
-                logger.error(f"Failed to update Booking ID {booking.pk}. Error: {e}")
-
-        self.stdout.write(self.style.SUCCESS(f'Successfully updated {updated_count} bookings.'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully updated {len(booking_ids)} bookings; final KM notifications were queued.'))
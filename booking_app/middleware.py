@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 from django.utils import translation, timezone
 import os
 import requests
@@ -5,6 +7,7 @@ from django.http import JsonResponse, HttpResponseForbidden
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
 
+from booking_app.session_registry import client_ip, touch_session
 from booking_app.utils import is_license_valid
 
 
@@ -18,7 +21,9 @@ class UserLanguageMiddleware:
             if user_language:
                 translation.activate(user_language)
 
-                request.session['_language'] = user_language
+                # Assigning marks the session modified, which would save it on every request.
+                if request.session.get('_language') != user_language:
+                    request.session['_language'] = user_language
 
         response = self.get_response(request)
         return response
@@ -48,32 +53,38 @@ class LicenseCheckMiddleware:
 class SessionActivityMiddleware:
     """
     Stores per-session metadata: session_created_at, last_activity, session_ip, session_user_agent.
-    Updates 'last_activity' on each request.
+    'last_activity' (and the UserSession registry row) is only rewritten once it is older than
+    SESSION_ACTIVITY_WRITE_INTERVAL seconds, so most requests cause no session write at all.
     """
     def __init__(self, get_response):
         self.get_response = get_response
+        self.write_interval = timedelta(seconds=getattr(settings, 'SESSION_ACTIVITY_WRITE_INTERVAL', 60))
+
+    def activity_is_stale(self, last_activity, now):
+        try:
+            return now - datetime.fromisoformat(last_activity) >= self.write_interval
+        except (TypeError, ValueError):
+            return True
 
     def __call__(self, request):
         # ensure session exists
         if hasattr(request, "session"):
-            now_iso = timezone.now().isoformat()
+            now = timezone.now()
             if not request.session.get('session_created_at'):
-                request.session['session_created_at'] = now_iso
-            request.session['last_activity'] = now_iso
+                request.session['session_created_at'] = now.isoformat()
+
+            if self.activity_is_stale(request.session.get('last_activity'), now):
+                request.session['last_activity'] = now.isoformat()
+                if request.user.is_authenticated and request.session.session_key:
+                    touch_session(request, now)
 
             # optional: store IP & user agent once
-            if not request.session.get('session_ip'):
-                # X-Forwarded-For handling if behind proxy:
-                ip = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR'))
-                if ip and ',' in ip:
-                    ip = ip.split(',')[0].strip()
-                request.session['session_ip'] = ip
-            if not request.session.get('session_user_agent'):
+            if 'session_ip' not in request.session:
+                request.session['session_ip'] = client_ip(request)
+            if 'session_user_agent' not in request.session:
                 request.session['session_user_agent'] = request.META.get('HTTP_USER_AGENT', '')[:255]
 
-            # Make sure to save the session (only if modified)
-            if request.session.modified:
-                request.session.save()
+            # SessionMiddleware saves the session on the way out, and only if it was modified.
 
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
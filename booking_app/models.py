@@ -3,13 +3,24 @@ import uuid
 
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, RangeOperators
+from django.db.backends.postgresql.psycopg_any import DateRange
 from django.contrib.auth.models import AbstractUser, Group, BaseUserManager
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 from datetime import date, timedelta
 from django.templatetags.static import static
 
+from . import roles
+from .cache import settings_cache
+
+
+# Statuses that keep the vehicle blocked for other bookings.
+UNAVAILABLE_BOOKING_STATUSES = ['pending', 'pending_contract', 'confirmed', 'pending_final_km']
+
 
 # --- Helper Functions for File Uploads ---
 
@@ -30,18 +41,26 @@ class User(AbstractUser):
     language = models.CharField(max_length=10, choices=settings.LANGUAGES, default='en')
     credentials_sent = models.BooleanField(default=False, verbose_name=_("Credentials Sent"))
 
+    @cached_property
+    def group_names(self):
+        """Names of the user's groups, loaded once per instance (see booking_app.roles)."""
+        return roles.load_group_names(self)
+
     @property
     def is_admin_member(self):
-        return self.groups.filter(name='Admin').exists()
+        return roles.ADMIN_GROUP in self.group_names
 
     @property
     def is_booking_admin_member(self):
-        return self.is_admin_member or self.groups.filter(name='Booking Admin').exists()
+        return self.is_admin_member or roles.BOOKING_ADMIN_GROUP in self.group_names
 
     @property
     def is_group_leader(self):
-        return self.is_booking_admin_member or self.groups.filter(
-            name__in=['tlheavy', 'tllight', 'tlapv', 'sd']).exists()
+        return self.is_booking_admin_member or bool(roles.LEADER_GROUPS & self.group_names)
+
+    @property
+    def managed_vehicle_types(self):
+        return roles.managed_vehicle_types(self.group_names)
 
 
 # --- START: Inactive User Management ---
@@ -69,6 +88,59 @@ class Location(models.Model):
         return self.name
 
 
+def compute_availability_slots(vehicle, bookings, today):
+    """
+    Build the free slots of `vehicle` from its blocking bookings (ordered by start_date,
+    ending on or after `today`). Each booking keeps a 3 business day buffer on both sides.
+    """
+    from .utils import add_business_days, subtract_business_days
+
+    bookings = list(bookings)
+    next_available_start = today + timedelta(days=1)
+
+    if vehicle.start_date and vehicle.start_date > next_available_start:
+        next_available_start = vehicle.start_date
+
+    slots = []
+    if not bookings:
+        slots.append({'start': next_available_start, 'end': vehicle.end_date})
+        return slots
+
+    if bookings[0].start_date <= today:
+        next_available_start = add_business_days(bookings[0].end_date, 3)
+
+    for booking in bookings:
+        gap_end = subtract_business_days(booking.start_date, 3)
+        if next_available_start <= gap_end:
+            slots.append({'start': next_available_start, 'end': gap_end})
+
+        potential_next_start = add_business_days(booking.end_date, 3)
+        if potential_next_start > next_available_start:
+            next_available_start = potential_next_start
+
+    slots.append({'start': next_available_start, 'end': vehicle.end_date})
+    return slots
+
+
+class VehicleQuerySet(models.QuerySet):
+    def with_availability(self, today=None):
+        """
+        Prefetch the blocking bookings of every vehicle in one query so that
+        get_availability_slots() needs no further queries, whatever the page size.
+        """
+        today = today or date.today()
+        return self.prefetch_related(
+            models.Prefetch(
+                'bookings',
+                queryset=Booking.objects.filter(
+                    status__in=Booking.UNAVAILABLE_STATUSES,
+                    end_date__gte=today
+                ).order_by('start_date'),
+                to_attr='availability_bookings',
+            )
+        )
+
+
 class Vehicle(models.Model):
     VEHICLE_TYPE_CHOICES = [
         ('HEAVY', _('Heavy')),
@@ -97,42 +169,39 @@ class Vehicle(models.Model):
     active_status = models.BooleanField(default=True)
     vehicle_value = models.DecimalField(_("Vehicle Value"), max_digits=12, decimal_places=2, null=True, blank=True)
 
-    def get_availability_slots(self):
-        from .utils import add_business_days, subtract_business_days
+    # Denormalised first availability slot, kept current by the booking signals and
+    # the refresh_vehicle_availability command so the fleet can be sorted/filtered in SQL.
+    next_available_date = models.DateField(_("Next Available Date"), null=True, blank=True, editable=False, db_index=True)
+    current_gap_end = models.DateField(_("Available Until (Current Slot)"), null=True, blank=True, editable=False)
+    # Change marker for conditional GETs on the booking feeds, which render the plate and type.
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
 
-        today = date.today()
-        tomorrow = today + timedelta(days=1)
+    objects = VehicleQuerySet.as_manager()
 
-        relevant_bookings = self.bookings.filter(
-            status__in=['pending', 'pending_contract', 'confirmed', 'pending_final_km'],
-            end_date__gte=today
-        ).order_by('start_date')
+    def get_availability_slots(self, today=None):
+        today = today or date.today()
 
-        slots = []
-        next_available_start = tomorrow
+        # Use the bookings prefetched by Vehicle.objects.with_availability() when present.
+        relevant_bookings = getattr(self, 'availability_bookings', None)
+        if relevant_bookings is None:
+            relevant_bookings = self.bookings.filter(
+                status__in=Booking.UNAVAILABLE_STATUSES,
+                end_date__gte=today
+            ).order_by('start_date')
 
-        if self.start_date and self.start_date > next_available_start:
-            next_available_start = self.start_date
+        return compute_availability_slots(self, relevant_bookings, today)
 
-        if not relevant_bookings.exists():
-            slots.append({'start': next_available_start, 'end': self.end_date})
-            return slots
+    def get_availability_fields(self, today=None):
+        """Values of next_available_date/current_gap_end for the current bookings."""
+        first_slot = self.get_availability_slots(today)[0]
+        return {'next_available_date': first_slot['start'], 'current_gap_end': first_slot['end']}
 
-        first_booking = relevant_bookings.first()
-        if first_booking.start_date <= today:
-            next_available_start = add_business_days(first_booking.end_date, 3)
-
-        for booking in relevant_bookings:
-            gap_end = subtract_business_days(booking.start_date, 3)
-            if next_available_start <= gap_end:
-                slots.append({'start': next_available_start, 'end': gap_end})
-
-            potential_next_start = add_business_days(booking.end_date, 3)
-            if potential_next_start > next_available_start:
-                next_available_start = potential_next_start
-
-        slots.append({'start': next_available_start, 'end': self.end_date})
-        return slots
+    def refresh_availability(self, today=None):
+        """Recompute and store the denormalised availability without firing save signals."""
+        fields = self.get_availability_fields(today)
+        Vehicle.objects.filter(pk=self.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(self, name, value)
 
     @property
     def get_picture_url(self):
@@ -166,7 +235,37 @@ class Client(models.Model):
         return f"{self.name} ({self.tax_number})"
 
 
+class BookingQuerySet(models.QuerySet):
+    def overlapping(self, vehicle, start_date, end_date):
+        """
+        Blocking bookings of `vehicle` whose occupancy clashes with a booking running
+        from start_date to end_date. Served by the GiST index of the exclusion constraint.
+
+        Rows without an occupancy (not yet backfilled by rebuild_booking_occupancy, or
+        legacy double bookings it had to leave empty) are invisible to the constraint,
+        so they are matched on their dates, with the same 3 business day turnaround.
+        """
+        from .utils import subtract_business_days
+        occupancy = Booking.occupancy_range(start_date, end_date)
+        return self.filter(vehicle=vehicle, status__in=UNAVAILABLE_BOOKING_STATUSES).filter(
+            models.Q(occupancy__overlap=occupancy)
+            | models.Q(
+                occupancy__isnull=True,
+                start_date__lte=occupancy.upper,
+                end_date__gte=subtract_business_days(start_date, 3),
+            )
+        )
+
+
+def is_occupancy_conflict(error):
+    """True if an IntegrityError was raised by the booking_no_overlapping_occupancy constraint."""
+    cause = getattr(error, '__cause__', None)
+    return getattr(cause, 'pgcode', None) == '23P01' or 'booking_no_overlapping_occupancy' in str(error)
+
+
 class Booking(models.Model):
+    UNAVAILABLE_STATUSES = UNAVAILABLE_BOOKING_STATUSES
+
     BOOKING_STATUS_CHOICES = (
         ('pending', _('Pending')),
         ('pending_contract', _('Pending Contract')),
@@ -198,6 +297,8 @@ class Booking(models.Model):
     final_km = models.PositiveIntegerField(_("Final Kilometers"), null=True, blank=True)
     motive = models.TextField(_("Motive"), blank=True)
     created_at = models.DateTimeField(_("Created At"), auto_now_add=True)
+    # Change marker for conditional GETs on the booking feeds; bulk .update() calls must set it themselves.
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True, db_index=True)
     needs_transport = models.BooleanField(_("Transport Required Before Booking"), default=False)
 
     # --- NEW FIELD for external workflow ---
@@ -209,6 +310,34 @@ class Booking(models.Model):
         help_text=_("Contract number received from the external service.")
     )
 
+    # Days the vehicle is held by this booking: start_date up to the 3 business day
+    # turnaround after end_date. Maintained by save().
+    occupancy = DateRangeField(null=True, blank=True, editable=False)
+
+    objects = BookingQuerySet.as_manager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Vehicle as loaded, so moving the booking also refreshes the vehicle it leaves (see signals).
+        instance._loaded_vehicle_id = instance.__dict__.get('vehicle_id')
+        return instance
+
+    @staticmethod
+    def occupancy_range(start_date, end_date):
+        from .utils import add_business_days
+        return DateRange(start_date, add_business_days(end_date, 3), bounds='[]')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields:  # an empty list still means "save nothing"
+            update_fields = kwargs['update_fields'] = {*update_fields, 'updated_at'}
+        if self.start_date and self.end_date:
+            self.occupancy = self.occupancy_range(self.start_date, self.end_date)
+            if update_fields and {'start_date', 'end_date'} & update_fields:
+                update_fields.add('occupancy')
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('booking_app:booking_detail', kwargs={'booking_pk': self.pk})
 
@@ -227,6 +356,22 @@ class Booking(models.Model):
         ordering = ['-booking_time']
         verbose_name = _("Booking")
         verbose_name_plural = _("Bookings")
+        indexes = [
+            # Calendar feeds select bookings overlapping a window: end_date >= start AND start_date < end.
+            models.Index(fields=['end_date', 'start_date'], name='booking_end_start_idx'),
+        ]
+        constraints = [
+            # Two blocking bookings of the same vehicle may never hold overlapping days.
+            # Requires the btree_gist extension (created in signals.ensure_btree_gist).
+            ExclusionConstraint(
+                name='booking_no_overlapping_occupancy',
+                expressions=[
+                    ('vehicle', RangeOperators.EQUAL),
+                    ('occupancy', RangeOperators.OVERLAPS),
+                ],
+                condition=models.Q(status__in=UNAVAILABLE_BOOKING_STATUSES),
+            ),
+        ]
 
 
 class EmailTemplate(models.Model):
@@ -305,6 +450,8 @@ class EmailTemplate(models.Model):
     send_to_groups = models.ManyToManyField(Group, blank=True)
     send_to_users = models.ManyToManyField(User, blank=True)
     send_to_distribution_lists = models.ManyToManyField('DistributionList', blank=True)
+    # Revision of subject/body for the compiled template cache (notifications.py).
+    updated_at = models.DateTimeField(_("Updated At"), auto_now=True)
 
     def __str__(self):
         return self.name
@@ -322,17 +469,125 @@ class DistributionList(models.Model):
 
 
 class EmailLog(models.Model):
+    STATUS_CHOICES = (
+        ('sent', _('Sent')),
+        ('failed', _('Failed')),
+    )
+
     recipient = models.EmailField()
     subject = models.CharField(max_length=255)
     sent_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=10)  # e.g., 'sent', 'failed'
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     error_message = models.TextField(blank=True, null=True)
 
     def __str__(self):
         return f"To: {self.recipient} - {self.subject} ({self.status})"
 
+    class Meta:
+        indexes = [
+            # Newest-first keyset pagination of the log viewer: ORDER BY sent_at DESC, id DESC.
+            models.Index(fields=['-sent_at', '-id'], name='emaillog_sent_at_idx'),
+            models.Index(fields=['status', '-sent_at'], name='emaillog_status_idx'),
+        ]
+
+
+class EmailOutbox(models.Model):
+    """
+    A rendered notification waiting to be sent. Rows are written in the caller's
+    transaction and drained by booking_app.outbox.dispatch_email_outbox.
+    """
+    STATUS_CHOICES = (
+        ('pending', _('Pending')),
+        ('sent', _('Sent')),
+        ('dead', _('Failed Permanently')),
+    )
+
+    event_trigger = models.CharField(max_length=50, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.subject} ({self.status}, {self.attempts} attempts)"
+
+    class Meta:
+        verbose_name = _("Outgoing Email")
+        verbose_name_plural = _("Email Outbox")
+        indexes = [
+            # The dispatcher's "due pending rows" scan.
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+
+class UserSession(models.Model):
+    """
+    Registry of logged-in sessions by user, so a user's sessions can be listed or
+    killed without decoding the whole django_session table. Rows are written at
+    login, removed at logout or when the session is killed, and purged after
+    expiry (see booking_app.session_registry).
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='user_sessions')
+    session_key = models.CharField(max_length=40, unique=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    last_activity = models.DateTimeField(default=timezone.now)
+    expire_date = models.DateTimeField(db_index=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True, default='')
+
+    def __str__(self):
+        return f"{self.user} ({self.session_key[:8]}…)"
+
+    class Meta:
+        verbose_name = _("User Session")
+        verbose_name_plural = _("User Sessions")
+        indexes = [
+            models.Index(fields=['user', '-last_activity'], name='usersession_user_activity_idx'),
+        ]
+
+
+class PeriodicJobRun(models.Model):
+    """
+    One run of a periodic job (booking_app.periodic) for one period, e.g. the
+    'update-ended-bookings' job for 2026-10-17. A period that succeeded is never
+    run again, whichever node picks it up.
+    """
+    STATUS_CHOICES = (
+        ('running', _('Running')),
+        ('succeeded', _('Succeeded')),
+        ('failed', _('Failed')),
+    )
+
+    job = models.CharField(max_length=64)
+    period = models.CharField(max_length=16)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    node = models.CharField(max_length=255, blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    output = models.TextField(blank=True)
+    error = models.TextField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.job} [{self.period}] ({self.status})"
+
+    class Meta:
+        verbose_name = _("Periodic Job Run")
+        verbose_name_plural = _("Periodic Job Runs")
+        ordering = ['-started_at']
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'period'], name='periodic_job_run_unique_period'),
+        ]
+
 
 class AutomationSettings(models.Model):
+    CACHE_KEY = 'automation_settings'
+
     pending_booking_automation_active = models.BooleanField(default=True)
     enable_pending_reminders = models.BooleanField(default=True)
     reminder_days_pending = models.PositiveIntegerField(default=3)
@@ -341,7 +596,8 @@ class AutomationSettings(models.Model):
 
     @classmethod
     def load(cls):
-        return cls.objects.get_or_create(pk=1)[0]
+        """The settings row, from the shared cache; signals.py drops it whenever the row is saved."""
+        return settings_cache.get_or_set(cls.CACHE_KEY, lambda: cls.objects.get_or_create(pk=1)[0])
 
 
 class Transport(models.Model):
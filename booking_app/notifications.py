@@ -0,0 +1,204 @@
+# booking_app/notifications.py
+
+import logging
+import threading
+from datetime import date, datetime
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db.models import Model, Prefetch, QuerySet
+from django.db.models.fields.files import FieldFile
+from django.template import Template
+
+from .cache import templates_cache
+
+logger = logging.getLogger('booking_app')
+
+# Process-local cache of parsed EmailTemplate subjects/bodies:
+# {template id: (revision, subject Template, body Template)}.
+_compiled_templates = {}
+_compiled_stats = {'hits': 0, 'misses': 0}
+_lock = threading.Lock()
+
+
+def get_compiled_template(template_obj):
+    """
+    (subject, body) Template objects for `template_obj`, parsed once per revision.
+
+    The revision is the row's updated_at, so a worker that never saw the save
+    signal still recompiles as soon as it reads the edited row.
+    """
+    revision = template_obj.updated_at
+    with _lock:
+        entry = _compiled_templates.get(template_obj.pk)
+        if entry is not None and entry[0] == revision:
+            _compiled_stats['hits'] += 1
+            return entry[1], entry[2]
+        _compiled_stats['misses'] += 1
+
+    subject, body = Template(template_obj.subject), Template(template_obj.body)
+    if template_obj.pk is not None and revision is not None:
+        with _lock:
+            _compiled_templates[template_obj.pk] = (revision, subject, body)
+    return subject, body
+
+
+def invalidate_compiled_template(template_id):
+    with _lock:
+        _compiled_templates.pop(template_id, None)
+
+
+def compiled_template_stats():
+    """Hit/miss counters and current size of this process's template cache."""
+    with _lock:
+        return {**_compiled_stats, 'size': len(_compiled_templates)}
+
+
+# --- Recipient resolution ---
+
+# Resolved recipient sets live in the 'templates' cache namespace; any change to
+# groups, users or distribution lists invalidates it (see signals.py).
+RECIPIENTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def bump_recipients_generation():
+    """Invalidate every cached recipient set."""
+    templates_cache.invalidate()
+
+
+def _resolve_recipients(template_ids):
+    """Group, user and distribution list addresses of the given templates, in five queries."""
+    from .models import EmailTemplate
+
+    active_users = (
+        get_user_model().objects
+        .filter(is_active=True, email__isnull=False)
+        .exclude(email='')
+        .only('pk', 'email')
+    )
+    templates = EmailTemplate.objects.filter(pk__in=template_ids).only('pk').prefetch_related(
+        Prefetch('send_to_groups__user_set', queryset=active_users),
+        Prefetch('send_to_users', queryset=active_users),
+        'send_to_distribution_lists',
+    )
+
+    resolved = {}
+    for template_obj in templates:
+        emails = set()
+        for group in template_obj.send_to_groups.all():
+            emails.update(user.email for user in group.user_set.all())
+        emails.update(user.email for user in template_obj.send_to_users.all())
+        for dl in template_obj.send_to_distribution_lists.all():
+            emails.update(dl.get_emails_as_list())
+        resolved[template_obj.pk] = frozenset(emails)
+    return resolved
+
+
+def get_template_recipients(templates):
+    """
+    {template id: frozenset of addresses} for the static recipients of `templates`
+    (the per-booking salesperson is added by the caller). Cached sets are read in
+    one cache round trip; the missing ones are resolved together.
+    """
+    keys = {t.pk: f"recipients:{t.pk}" for t in templates}
+    cached = templates_cache.get_many(keys.values())
+    recipients = {pk: cached[key] for pk, key in keys.items() if key in cached}
+
+    missing = [pk for pk in keys if pk not in recipients]
+    if missing:
+        fresh = _resolve_recipients(missing)
+        templates_cache.set_many({keys[pk]: emails for pk, emails in fresh.items()}, RECIPIENTS_CACHE_TIMEOUT)
+        recipients.update(fresh)
+    return recipients
+
+
+# --- Notification envelopes ---
+
+# Context values handed to send_system_notification_task are reduced to model
+# references and scalars; the worker loads each referenced model type with one
+# select_related query.
+ENVELOPE_KEY = "__notification_envelope__"
+
+
+def _encode(value):
+    if isinstance(value, Model):
+        if value.pk is None:
+            # Deleted or never saved: keep the column values, nothing to reload.
+            return {
+                "__snapshot__": value._meta.label_lower,
+                "fields": {f.attname: _encode(f.value_from_object(value)) for f in value._meta.concrete_fields},
+            }
+        return {"__ref__": value._meta.label_lower, "pk": str(value.pk)}
+    if isinstance(value, FieldFile):
+        return value.name or ''
+    if isinstance(value, dict):
+        return {str(k): _encode(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, QuerySet)):
+        return [_encode(v) for v in value]
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)  # Decimal, UUID, lazy translations, ...
+
+
+def build_notification_envelope(context):
+    """JSON-safe, query-free encoding of a notification context for Celery."""
+    return {ENVELOPE_KEY: 1, "data": _encode(context or {})}
+
+
+def is_notification_envelope(value):
+    return isinstance(value, dict) and ENVELOPE_KEY in value
+
+
+def _collect_refs(value, refs):
+    if isinstance(value, dict):
+        if "__ref__" in value:
+            refs.setdefault(value["__ref__"], set()).add(value["pk"])
+        else:
+            for v in value.values():
+                _collect_refs(v, refs)
+    elif isinstance(value, list):
+        for v in value:
+            _collect_refs(v, refs)
+
+
+def _load_refs(refs):
+    """{(label, pk): instance}, one query per model with its foreign keys joined."""
+    loaded = {}
+    for label, pks in refs.items():
+        model = apps.get_model(label)
+        relations = [f.name for f in model._meta.concrete_fields if f.is_relation]
+        for obj in model._default_manager.select_related(*relations).filter(pk__in=pks):
+            loaded[(label, str(obj.pk))] = obj
+    return loaded
+
+
+def _decode(value, loaded):
+    if isinstance(value, list):
+        return [_decode(v, loaded) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if "__ref__" in value:
+        obj = loaded.get((value["__ref__"], value["pk"]))
+        if obj is None:
+            logger.warning(f"Notification context object {value['__ref__']}:{value['pk']} no longer exists")
+        return obj
+    if "__snapshot__" in value:
+        model = apps.get_model(value["__snapshot__"])
+        return model(**{k: _decode(v, loaded) for k, v in value["fields"].items()})
+    if "__datetime__" in value:
+        return datetime.fromisoformat(value["__datetime__"])
+    if "__date__" in value:
+        return date.fromisoformat(value["__date__"])
+    return {k: _decode(v, loaded) for k, v in value.items()}
+
+
+def hydrate_notification_envelope(envelope):
+    """The context dict of `envelope`, with model references loaded from the database."""
+    data = envelope["data"]
+    refs = {}
+    _collect_refs(data, refs)
+    return _decode(data, _load_refs(refs))
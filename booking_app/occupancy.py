@@ -0,0 +1,166 @@
+# booking_app/occupancy.py
+
+from datetime import date, timedelta
+
+from .cache import vehicles_cache
+from .models import Vehicle
+
+# Days covered by the index, starting tomorrow.
+HORIZON_DAYS = 90
+
+# Rows are keyed by their first day, so yesterday's rows simply stop being read.
+ROW_CACHE_TIMEOUT = 60 * 60 * 48
+
+
+def _row_key(start, vehicle_id):
+    return f"occupancy:{start.isoformat()}:{vehicle_id}"
+
+
+def vehicle_free_mask(vehicle, start, days=HORIZON_DAYS):
+    """
+    Free days of `vehicle` as an int bitset: bit i is set when the vehicle can be
+    booked on start + i. Built from get_availability_slots(), so booking buffers and
+    the vehicle's own start/end dates are applied exactly as on the vehicle pages.
+    """
+    mask = 0
+    for slot in vehicle.get_availability_slots(start - timedelta(days=1)):
+        first = max((slot['start'] - start).days, 0)
+        last = days - 1 if slot['end'] is None else min((slot['end'] - start).days, days - 1)
+        if first <= last:
+            mask |= ((1 << (last - first + 1)) - 1) << first
+    return mask
+
+
+def _bit_sliced_counts(masks, days):
+    """
+    Per-day population count of `masks`. The masks are summed as binary counters
+    (plane k holds bit k of every day's count), so each vehicle costs a few
+    whole-row operations instead of one operation per day.
+    """
+    planes = []
+    for mask in masks:
+        carry = mask
+        for k, plane in enumerate(planes):
+            planes[k] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+    return [
+        sum(((plane >> day) & 1) << k for k, plane in enumerate(planes))
+        for day in range(days)
+    ]
+
+
+def _run_starts(mask, length):
+    """Bits of `mask` that start `length` consecutive set bits (log-step shifting)."""
+    runs, span = mask, 1
+    while span < length:
+        step = min(span, length - span)
+        runs &= runs >> step
+        span += step
+    return runs
+
+
+def update_vehicle_row(vehicle, today=None):
+    """Recompute and cache one vehicle's row after its bookings or dates changed."""
+    start = (today or date.today()) + timedelta(days=1)
+    key = _row_key(start, vehicle.pk)
+    if vehicle.active_status:
+        vehicles_cache.set(key, vehicle_free_mask(vehicle, start), ROW_CACHE_TIMEOUT)
+    else:
+        vehicles_cache.delete(key)
+
+
+class FleetOccupancy:
+    """
+    Per-day free/busy bitsets for the active fleet over the next HORIZON_DAYS days.
+
+    Aggregate questions ("how many HEAVY vehicles are free each day", "first day a
+    LIGHT vehicle is free for 5 days running") are answered with whole-row integer
+    operations over the cached rows.
+    """
+
+    def __init__(self, start, rows, days=HORIZON_DAYS):
+        self.start = start
+        self.days = days
+        self.rows = rows  # {vehicle_id: (vehicle_type, mask)}
+
+    @classmethod
+    def load(cls, vehicle_types=None, today=None):
+        """Read the rows from the cache, building the missing ones in two queries."""
+        today = today or date.today()
+        start = today + timedelta(days=1)
+
+        vehicles = Vehicle.objects.filter(active_status=True)
+        if vehicle_types is not None:
+            vehicles = vehicles.filter(vehicle_type__in=vehicle_types)
+        types = dict(vehicles.values_list('pk', 'vehicle_type'))
+
+        keys = {_row_key(start, pk): pk for pk in types}
+        masks = {keys[key]: mask for key, mask in vehicles_cache.get_many(keys).items()}
+
+        missing = [pk for pk in types if pk not in masks]
+        if missing:
+            fresh = {
+                v.pk: vehicle_free_mask(v, start)
+                for v in Vehicle.objects.filter(pk__in=missing).with_availability(today)
+            }
+            vehicles_cache.set_many({_row_key(start, pk): mask for pk, mask in fresh.items()}, ROW_CACHE_TIMEOUT)
+            masks.update(fresh)
+
+        return cls(start, {pk: (types[pk], masks[pk]) for pk in types})
+
+    def masks(self, vehicle_type=None):
+        return [mask for vtype, mask in self.rows.values() if vehicle_type is None or vtype == vehicle_type]
+
+    def dates(self):
+        return [self.start + timedelta(days=i) for i in range(self.days)]
+
+    def free_counts(self, vehicle_type=None):
+        """Number of free vehicles on each day of the horizon."""
+        return _bit_sliced_counts(self.masks(vehicle_type), self.days)
+
+    def free_vehicles(self, day, vehicle_type=None):
+        """IDs of the vehicles free on `day`."""
+        offset = (day - self.start).days
+        if not 0 <= offset < self.days:
+            return []
+        return [
+            pk for pk, (vtype, mask) in self.rows.items()
+            if (vehicle_type is None or vtype == vehicle_type) and (mask >> offset) & 1
+        ]
+
+    def first_free_run(self, length, vehicle_type=None):
+        """
+        First day on which some vehicle is free for `length` consecutive days, or
+        None if no such run fits inside the horizon.
+        """
+        if length < 1:
+            return self.start
+        starts = 0
+        for mask in self.masks(vehicle_type):
+            starts |= _run_starts(mask, length)
+        if not starts:
+            return None
+        return self.start + timedelta(days=(starts & -starts).bit_length() - 1)
+
+    def heatmap(self, vehicle_types, days=None, run_length=None):
+        """JSON-ready free counts per vehicle type, for the fleet occupancy heatmap."""
+        days = min(days or self.days, self.days)
+        data = {
+            'start': self.start.isoformat(),
+            'dates': [d.isoformat() for d in self.dates()[:days]],
+            'types': {},
+        }
+        for vtype in vehicle_types:
+            entry = {
+                'vehicles': len(self.masks(vtype)),
+                'free': self.free_counts(vtype)[:days],
+            }
+            if run_length:
+                first = self.first_free_run(run_length, vtype)
+                entry['first_free_run'] = first.isoformat() if first else None
+            data['types'][vtype] = entry
+        return data
@@ -0,0 +1,105 @@
+# booking_app/outbox.py
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .graph import GRAPH_BATCH_LIMIT
+from .models import EmailLog, EmailOutbox
+from .utils import send_emails_with_graph_api
+
+logger = logging.getLogger('booking_app')
+
+
+def _max_attempts():
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 6)
+
+
+def _retry_delay(attempts):
+    """Exponential backoff: base, 2x base, 4x base, ... capped at one day."""
+    base = getattr(settings, 'EMAIL_OUTBOX_BACKOFF_SECONDS', 60)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), 24 * 60 * 60))
+
+
+def _dispatch_batch(batch_size):
+    """
+    Lock up to `batch_size` due messages (skipping rows another dispatcher holds),
+    send them and record the outcome. Returns the number of rows processed.
+    """
+    with transaction.atomic():
+        messages = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'pk')[:batch_size]
+        )
+        if not messages:
+            return 0
+
+        try:
+            results = send_emails_with_graph_api([
+                {'subject': m.subject, 'body': m.body, 'recipient_list': m.recipients}
+                for m in messages
+            ])
+        except Exception as e:
+            logger.error(f"Email outbox dispatch failed: {e}", exc_info=True)
+            results = [(False, str(e))] * len(messages)
+
+        now = timezone.now()
+        logs = []
+        for message, (success, response_message) in zip(messages, results):
+            message.attempts += 1
+            if success:
+                message.status = 'sent'
+                message.sent_at = now
+                message.last_error = None
+            else:
+                message.last_error = response_message
+                if message.attempts >= _max_attempts():
+                    message.status = 'dead'
+                    logger.error(f"Email '{message.subject}' dead-lettered after {message.attempts} attempts: {response_message}")
+                else:
+                    message.next_attempt_at = now + _retry_delay(message.attempts)
+
+            # The log records final outcomes only; retries are tracked on the outbox row.
+            if message.status != 'pending':
+                logs.extend(
+                    EmailLog(
+                        recipient=r,
+                        subject=message.subject,
+                        status="sent" if success else "failed",
+                        error_message=None if success else response_message
+                    )
+                    for r in message.recipients
+                )
+
+        EmailLog.objects.bulk_create(logs)
+        EmailOutbox.objects.bulk_update(
+            messages, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'],
+        )
+    return len(messages)
+
+
+def dispatch_email_outbox(batch_size=GRAPH_BATCH_LIMIT, max_batches=None):
+    """
+    Drain due outbox messages in batches until none are left (or `max_batches`
+    batches were sent). Safe to run in several processes at once.
+    """
+    total = batches = 0
+    while max_batches is None or batches < max_batches:
+        processed = _dispatch_batch(batch_size)
+        if not processed:
+            break
+        total += processed
+        batches += 1
+    return total
+
+
+def retry_dead_messages():
+    """Put every dead-lettered message back in the queue for a fresh set of attempts."""
+    return EmailOutbox.objects.filter(status='dead').update(
+        status='pending', attempts=0, next_attempt_at=timezone.now(),
+    )
@@ -0,0 +1,207 @@
+# booking_app/partitions.py
+"""
+Monthly range partitioning of the EmailLog table on sent_at.
+
+Django has no notion of partitioned tables, so the table created by the
+migrations is converted once with convert_email_log_to_partitions() (the
+manage_email_log_partitions --convert command). After that the model is used
+as before: the database primary key becomes (id, sent_at), ids still come
+from the table's sequence, and Django keeps addressing rows by id.
+
+Partitions are named <table>_pYYYYMM and cover one calendar month in UTC; a
+default partition catches anything outside the created months.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import date, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from .models import EmailLog
+
+logger = logging.getLogger('booking_app')
+
+TABLE = EmailLog._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def _month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def _bound(month):
+    return f"'{month:%Y-%m-%d} 00:00:00+00'"
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+            [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """{first day of month: partition name} of the monthly partitions currently attached."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    prefix = f"{TABLE}_p"
+    partitions = {}
+    for name in names:
+        if name.startswith(prefix):
+            stamp = name[len(prefix):]
+            partitions[date(int(stamp[:4]), int(stamp[4:]), 1)] = name
+    return partitions
+
+
+def _create_partition(cursor, month):
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS "{_partition_name(month)}" PARTITION OF "{TABLE}" '
+        f'FOR VALUES FROM ({_bound(month)}) TO ({_bound(_add_months(month, 1))})'
+    )
+
+
+def ensure_email_log_partitions(months_ahead=None, today=None):
+    """Create the partitions of the current month and the next `months_ahead` months."""
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'EMAIL_LOG_PARTITIONS_AHEAD', 3)
+    current = _month_start(today or date.today())
+    existing = list_partitions()
+
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            month = _add_months(current, offset)
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(_partition_name(month))
+    return created
+
+
+@transaction.atomic
+def convert_email_log_to_partitions(months_ahead=None):
+    """
+    Rebuild the plain EmailLog table as a partitioned one, copying every row into
+    its month. Runs in one transaction; does nothing if already partitioned.
+    """
+    if is_partitioned():
+        return False
+
+    legacy = f"{TABLE}_legacy"
+    index_names = [index.name for index in EmailLog._meta.indexes]
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+        for name in index_names:
+            cursor.execute(f'ALTER INDEX IF EXISTS "{name}" RENAME TO "{name}_legacy"')
+
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE (sent_at)'
+        )
+        # Partitioned tables need the partition key in their primary key.
+        cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, sent_at)')
+        cursor.execute(f'CREATE SEQUENCE "{TABLE}_id_part_seq" OWNED BY "{TABLE}".id')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval(\'"{TABLE}_id_part_seq"\')')
+
+        for index in EmailLog._meta.indexes:
+            cursor.execute(str(index.create_sql(EmailLog, connection.schema_editor())))
+
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'SELECT min(sent_at) FROM "{legacy}"')
+        oldest = cursor.fetchone()[0]
+        month = _month_start(oldest.astimezone(dt_timezone.utc).date() if oldest else date.today())
+        while month <= _month_start(date.today()):
+            _create_partition(cursor, month)
+            month = _add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{legacy}"')
+        cursor.execute(
+            f'SELECT setval(\'"{TABLE}_id_part_seq"\', COALESCE((SELECT max(id) FROM "{TABLE}"), 0) + 1, false)'
+        )
+        cursor.execute(f'DROP TABLE "{legacy}"')
+
+    ensure_email_log_partitions(months_ahead)
+    return True
+
+
+def _export_partition(name, archive_dir):
+    """Write every row of partition `name` to <archive_dir>/<name>.jsonl.gz; returns the row count."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+    tmp_path = f"{path}.tmp"
+    columns = [field.column for field in EmailLog._meta.concrete_fields]
+
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor, gzip.open(tmp_path, 'wt', encoding='utf-8') as out:
+        # Server-side cursor inside a transaction: rows are streamed, not loaded at once.
+        cursor.execute(f'DECLARE archive_cursor NO SCROLL CURSOR FOR SELECT {", ".join(columns)} FROM "{name}" ORDER BY id')
+        while True:
+            cursor.execute('FETCH 5000 FROM archive_cursor')
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            for row in rows:
+                out.write(json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + "\n")
+            count += len(rows)
+        cursor.execute('CLOSE archive_cursor')
+    os.replace(tmp_path, path)
+    return count
+
+
+def archive_expired_email_log_partitions(retention_months=None, archive_dir=None, today=None):
+    """
+    Archive and drop the monthly partitions that ended more than `retention_months`
+    months ago. Each partition is exported to compressed JSONL first, then detached
+    and dropped in one transaction. Returns [(partition name, rows archived)].
+    """
+    if retention_months is None:
+        retention_months = getattr(settings, 'EMAIL_LOG_RETENTION_MONTHS', 12)
+    if archive_dir is None:
+        archive_dir = getattr(settings, 'EMAIL_LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive', 'email_logs'))
+
+    cutoff = _add_months(_month_start(today or date.today()), -retention_months)
+    archived = []
+    for month, name in sorted(list_partitions().items()):
+        if _add_months(month, 1) > cutoff:
+            continue
+        count = _export_partition(name, archive_dir)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        logger.info(f"Archived EmailLog partition {name} ({count} rows) to {archive_dir}")
+        archived.append((name, count))
+    return archived
+
+
+def maintain_email_log_partitions():
+    """Daily job: create upcoming partitions and archive expired ones."""
+    if not is_partitioned():
+        logger.info("EmailLog is not partitioned yet; run manage_email_log_partitions --convert.")
+        return [], []
+    return ensure_email_log_partitions(), archive_expired_email_log_partitions()
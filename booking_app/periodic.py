@@ -0,0 +1,218 @@
+# booking_app/periodic.py
+"""
+Registry of the periodic jobs run by Celery beat.
+
+Every job has a period (daily or weekly, due from a local time; or a fixed
+interval, due at once).
+Beat fires run_periodic_job_task for each job every few minutes; a run only
+happens when the job is due, its current period has not succeeded yet and the
+job's Redis lock is free. The outcome is stored as a PeriodicJobRun, so:
+
+- several nodes can run beat and workers without a job running twice;
+- a run missed because every node was down, or one that failed, is picked up
+  at the next tick. The jobs work on everything overdue (not just "yesterday"),
+  so one late run catches up on the missed periods.
+"""
+
+import logging
+import socket
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import date, time, timedelta
+from io import StringIO
+
+import redis
+from django.conf import settings
+from django.core.management import call_command
+from django.utils import timezone
+
+from .models import PeriodicJobRun
+
+logger = logging.getLogger('booking_app')
+
+LOCK_PREFIX = "periodic_job_lock:"
+
+# Failed runs are retried at the following ticks, up to this many attempts per period.
+MAX_ATTEMPTS = 3
+
+# Days of run history kept by prune_periodic_job_runs (interval jobs record a run every few minutes).
+RUN_RETENTION_DAYS = 90
+INTERVAL_RUN_RETENTION_DAYS = 2
+
+# Deletes the lock only if it still holds our token (it may have expired and been taken).
+_RELEASE_LOCK = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+_redis_client = None
+
+
+def _redis():
+    global _redis_client
+    if _redis_client is None:
+        url = getattr(settings, 'PERIODIC_JOBS_REDIS_URL', settings.CELERY_BROKER_URL)
+        _redis_client = redis.Redis.from_url(url)
+    return _redis_client
+
+
+@contextmanager
+def job_lock(name, timeout):
+    """Yield True if this process holds the job's lock (SET NX with a TTL of `timeout` seconds)."""
+    key, token = f"{LOCK_PREFIX}{name}", uuid.uuid4().hex
+    acquired = bool(_redis().set(key, token, nx=True, px=int(timeout * 1000)))
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            _redis().eval(_RELEASE_LOCK, 1, key, token)
+
+
+class PeriodicJob:
+    def __init__(self, name, run, period='daily', at=time(0, 0), weekday=0, every=None, lock_timeout=30 * 60):
+        self.name = name
+        self.run = run  # callable returning the text kept as the run's output
+        self.period = period
+        self.at = at
+        self.weekday = weekday  # weekly jobs only, Monday = 0
+        self.every = every  # interval jobs only, in minutes (a divisor of 60 * 24)
+        self.lock_timeout = lock_timeout
+
+    def __repr__(self):
+        return f"<PeriodicJob {self.name} ({self.period})>"
+
+    def period_key(self, now):
+        if self.period == 'weekly':
+            year, week, _ = now.isocalendar()
+            return f"{year}-W{week:02d}"
+        if self.period == 'interval':
+            minutes = (now.hour * 60 + now.minute) // self.every * self.every
+            return f"{now.date().isoformat()}T{minutes // 60:02d}:{minutes % 60:02d}"
+        return now.date().isoformat()
+
+    def is_due(self, now):
+        if self.period == 'interval':
+            return True
+        if self.period == 'weekly':
+            return (now.weekday(), now.time()) >= (self.weekday, self.at)
+        return now.time() >= self.at
+
+
+def _command(name, **options):
+    def run():
+        out = StringIO()
+        call_command(name, stdout=out, stderr=out, **options)
+        return out.getvalue()
+    return run
+
+
+def _purge_expired_sessions():
+    from .session_registry import purge_expired_sessions
+    return f"Purged {purge_expired_sessions()} expired user sessions"
+
+
+def _daily_error_report():
+    from .tasks import send_daily_error_report
+    send_daily_error_report()
+    return ""
+
+
+def _prune_periodic_job_runs():
+    return f"Pruned {prune_periodic_job_runs()} periodic job runs"
+
+
+def _maintain_email_log_partitions():
+    from .partitions import maintain_email_log_partitions
+    created, archived = maintain_email_log_partitions()
+    return f"EmailLog partitions: {len(created)} created, {len(archived)} archived"
+
+
+def _refresh_license_status():
+    # Keeps the shared license status fresh so web requests never refresh it themselves.
+    from .utils import refresh_license_status_once
+    return "" if refresh_license_status_once(raise_errors=True) else "Already being refreshed by another process"
+
+
+# Due times are local (TIME_ZONE).
+PERIODIC_JOBS = {job.name: job for job in (
+    PeriodicJob('update-ended-bookings', _command('update_ended_bookings'), at=time(0, 10)),
+    PeriodicJob('update-ongoing-bookings', _command('update_ongoing_bookings'), at=time(0, 15)),
+    PeriodicJob('deactivate-expired-vehicles', _command('deactivate_expired_vehicles'), at=time(0, 20)),
+    PeriodicJob('refresh-vehicle-availability', _command('refresh_vehicle_availability'), at=time(0, 30)),
+    PeriodicJob('check-pending-bookings', _command('check_pending_bookings', mode='inline'), at=time(7, 0)),
+    PeriodicJob('send-booking-reminders', _command('send_booking_reminders', mode='inline'), at=time(8, 0)),
+    PeriodicJob('weekly-transports-digest', _command('send_weekly_transports_digest'),
+                period='weekly', weekday=0, at=time(7, 30)),
+    PeriodicJob('purge-expired-sessions', _purge_expired_sessions, at=time(3, 30)),
+    PeriodicJob('daily-error-report', _daily_error_report, at=time(23, 30)),
+    PeriodicJob('maintain-email-log-partitions', _maintain_email_log_partitions, at=time(3, 15)),
+    PeriodicJob('prune-periodic-job-runs', _prune_periodic_job_runs, at=time(3, 45)),
+    PeriodicJob('refresh-license-status', _refresh_license_status, period='interval', every=10, lock_timeout=60),
+)}
+
+
+def prune_periodic_job_runs(now=None):
+    """
+    Delete the runs that finished more than the retention ago, except each job's
+    latest success (last_succeeded_date relies on it). Returns the number deleted.
+    """
+    now = now or timezone.now()
+    deleted = 0
+    for job in PERIODIC_JOBS.values():
+        days = INTERVAL_RUN_RETENTION_DAYS if job.period == 'interval' else RUN_RETENTION_DAYS
+        latest = PeriodicJobRun.objects.filter(job=job.name, status='succeeded').order_by('-period').values('pk')[:1]
+        count, _ = (
+            PeriodicJobRun.objects
+            .filter(job=job.name, finished_at__lt=now - timedelta(days=days))
+            .exclude(pk__in=latest)
+            .delete()
+        )
+        deleted += count
+    return deleted
+
+
+def last_succeeded_date(name):
+    """Last day a daily or interval job `name` succeeded for, or None if it never did."""
+    run = PeriodicJobRun.objects.filter(job=name, status='succeeded').order_by('-period').first()
+    return date.fromisoformat(run.period[:10]) if run else None
+
+
+def run_periodic_job(name, now=None, force=False):
+    """
+    Run job `name` for the current period if it is due and has not succeeded yet.
+    `force` skips the due-time check (not the per-period idempotency). Returns the
+    PeriodicJobRun, or None when nothing was run.
+    """
+    job = PERIODIC_JOBS[name]
+    now = timezone.localtime(now)
+    if not force and not job.is_due(now):
+        return None
+
+    period = job.period_key(now)
+    if PeriodicJobRun.objects.filter(job=name, period=period, status='succeeded').exists():
+        return None
+
+    with job_lock(name, job.lock_timeout) as acquired:
+        if not acquired:
+            logger.info(f"Periodic job '{name}' is already running on another node.")
+            return None
+
+        run, _ = PeriodicJobRun.objects.get_or_create(job=name, period=period)
+        if run.status == 'succeeded' or (run.status == 'failed' and run.attempts >= MAX_ATTEMPTS):
+            return None
+
+        run.status = 'running'
+        run.attempts += 1
+        run.node = socket.gethostname()
+        run.started_at = timezone.now()
+        run.finished_at = run.error = None
+        run.save()
+
+        try:
+            run.output = job.run() or ""
+            run.status = 'succeeded'
+        except Exception as e:
+            run.status = 'failed'
+            run.error = traceback.format_exc()
+            logger.error(f"Periodic job '{name}' failed for {period} (attempt {run.attempts}): {e}")
+        run.finished_at = timezone.now()
+        run.save()
+    return run
@@ -0,0 +1,41 @@
+# booking_app/presence.py
+"""
+Who is online: {user_id: (is_online, last_activity)} for a set of users, from
+one aggregate query over the UserSession registry. Results are cached per user
+for a few seconds; logins, logouts and killed sessions drop the entry.
+"""
+
+from django.db.models import Max
+from django.utils import timezone
+
+from .cache import presence_cache
+from .models import UserSession
+
+PRESENCE_CACHE_TIMEOUT = 30
+OFFLINE = (False, None)
+
+
+def get_presence_map(user_ids):
+    """(is_online, last_activity) of each user; users without a live session are (False, None)."""
+    user_ids = list(user_ids)
+    presence = presence_cache.get_many(user_ids)
+
+    missing = [pk for pk in user_ids if pk not in presence]
+    if missing:
+        fresh = dict.fromkeys(missing, OFFLINE)
+        rows = (
+            UserSession.objects
+            .filter(user_id__in=missing, expire_date__gt=timezone.now())
+            .values('user_id')
+            .annotate(last_activity=Max('last_activity'))
+        )
+        for row in rows:
+            fresh[row['user_id']] = (True, row['last_activity'])
+        presence_cache.set_many(fresh, PRESENCE_CACHE_TIMEOUT)
+        presence.update(fresh)
+
+    return presence
+
+
+def invalidate_presence(user_ids):
+    presence_cache.delete_many(user_ids)
@@ -0,0 +1,54 @@
+# booking_app/roles.py
+"""
+Group-based roles of a user, loaded once per user instance.
+
+User.group_names holds the names of the user's groups; the role properties on
+User (is_admin_member, is_booking_admin_member, is_group_leader,
+managed_vehicle_types) are computed from it instead of querying the groups
+table each time. Since request.user is a single instance per request, a page
+costs at most one group lookup. Across requests the names are kept in the
+'roles' cache namespace, which signals.py invalidates whenever memberships or
+groups change.
+"""
+
+from .cache import roles_cache
+
+ADMIN_GROUP = 'Admin'
+BOOKING_ADMIN_GROUP = 'Booking Admin'
+LEADER_GROUPS = frozenset({'tlheavy', 'tllight', 'tlapv', 'sd'})
+
+# Vehicle types managed through each leader group; booking admins manage them all.
+MANAGED_VEHICLE_TYPES = {
+    'sd': ('LIGHT', 'HEAVY'),
+    'tlheavy': ('HEAVY',),
+    'tllight': ('LIGHT',),
+    'tlapv': ('APV',),
+}
+ALL_VEHICLE_TYPES = ('LIGHT', 'HEAVY', 'APV')
+
+GROUP_NAMES_CACHE_TIMEOUT = 60 * 60
+
+
+def bump_membership_revision():
+    """Invalidate the cached group names of every user."""
+    roles_cache.invalidate()
+
+
+def load_group_names(user):
+    """Names of `user`'s groups, from the cache or in one query."""
+    if user.pk is None:
+        return frozenset()
+    return roles_cache.get_or_set(
+        f"group_names:{user.pk}",
+        lambda: frozenset(user.groups.values_list('name', flat=True)),
+        GROUP_NAMES_CACHE_TIMEOUT,
+    )
+
+
+def managed_vehicle_types(group_names):
+    if BOOKING_ADMIN_GROUP in group_names or ADMIN_GROUP in group_names:
+        return list(ALL_VEHICLE_TYPES)
+    types = set()
+    for name in group_names & MANAGED_VEHICLE_TYPES.keys():
+        types.update(MANAGED_VEHICLE_TYPES[name])
+    return sorted(types)
@@ -0,0 +1,122 @@
+# booking_app/session_registry.py
+"""
+Maintenance of the UserSession registry (who is logged in where).
+
+register_session() runs at login (signals.py), touch_session() from
+SessionActivityMiddleware, rotate_session() when a view cycles the session key
+(password change) and unregister_sessions() whenever sessions are killed or a
+user logs out. Expired rows are removed together with the expired
+Session rows by purge_expired_sessions(), a daily periodic job.
+"""
+
+import logging
+
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+
+from .models import UserSession
+from .presence import invalidate_presence
+
+logger = logging.getLogger('booking_app')
+
+
+def client_ip(request):
+    ip = request.META.get('HTTP_X_FORWARDED_FOR', request.META.get('REMOTE_ADDR'))
+    if ip and ',' in ip:
+        ip = ip.split(',')[0].strip()
+    return ip or None
+
+
+def register_session(request, user):
+    """Record the request's (freshly cycled) session as one of `user`'s sessions."""
+    session = request.session
+    if not session.session_key:
+        session.save()
+    now = timezone.now()
+    UserSession.objects.update_or_create(
+        session_key=session.session_key,
+        defaults={
+            'user': user,
+            'created_at': now,
+            'last_activity': now,
+            'expire_date': session.get_expiry_date(),
+            'ip': client_ip(request),
+            'user_agent': request.META.get('HTTP_USER_AGENT', '')[:255],
+        },
+    )
+    invalidate_presence([user.pk])
+
+
+def touch_session(request, now=None):
+    """
+    Move the session's last_activity (and sliding expiry) forward. A session
+    whose key has no row yet (cycled since login) is registered on the spot.
+    """
+    touched = UserSession.objects.filter(session_key=request.session.session_key).update(
+        last_activity=now or timezone.now(),
+        expire_date=request.session.get_expiry_date(),
+    )
+    if not touched:
+        register_session(request, request.user)
+
+
+def rotate_session(request, old_session_key):
+    """Move the registry row of `old_session_key` to the request's new key, after session.cycle_key()."""
+    moved = UserSession.objects.filter(session_key=old_session_key).update(
+        session_key=request.session.session_key,
+        last_activity=timezone.now(),
+        expire_date=request.session.get_expiry_date(),
+    )
+    if not moved:
+        register_session(request, request.user)
+
+
+def unregister_sessions(session_keys):
+    """Delete the given sessions and their registry rows."""
+    session_keys = list(session_keys)
+    registered = UserSession.objects.filter(session_key__in=session_keys)
+    user_ids = set(registered.values_list('user_id', flat=True))
+    Session.objects.filter(session_key__in=session_keys).delete()
+    registered.delete()
+    invalidate_presence(user_ids)
+
+
+def purge_expired_sessions():
+    """Delete expired sessions and registry rows; returns the number of registry rows removed."""
+    now = timezone.now()
+    Session.objects.filter(expire_date__lt=now).delete()
+    count, _ = UserSession.objects.filter(expire_date__lt=now).delete()
+    return count
+
+
+def backfill_session_registry():
+    """
+    One-off: register the live sessions created before the registry existed.
+    This is the only place that still decodes every session.
+    """
+    count = 0
+    for s in Session.objects.filter(expire_date__gt=timezone.now()).iterator():
+        data = s.get_decoded()
+        user_id = data.get('_auth_user_id')
+        if not user_id or UserSession.objects.filter(session_key=s.session_key).exists():
+            continue
+        activity = data.get('last_activity')
+        try:
+            last_activity = timezone.datetime.fromisoformat(activity) if activity else timezone.now()
+        except ValueError:
+            last_activity = timezone.now()
+        try:
+            UserSession.objects.create(
+                user_id=user_id,
+                session_key=s.session_key,
+                last_activity=last_activity,
+                created_at=last_activity,
+                expire_date=s.expire_date,
+                ip=data.get('session_ip') or None,
+                user_agent=(data.get('session_user_agent') or '')[:255],
+            )
+        except Exception as e:
+            logger.warning(f"Could not register session {s.session_key[:8]}: {e}")
+            continue
+        count += 1
+    return count
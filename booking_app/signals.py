@@ -1,9 +1,17 @@
 import requests
-from django.db.models.signals import post_save
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_migrate
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.contrib.auth.models import Group
 from .utils import kill_user_sessions
-from .models import Booking
+from .models import AutomationSettings, Booking, Client, DistributionList, EmailTemplate, Vehicle
+from .notifications import bump_recipients_generation, invalidate_compiled_template
+from .occupancy import update_vehicle_row
+from .cache import bookings_cache, settings_cache
+from .roles import bump_membership_revision
+from .session_registry import register_session, unregister_sessions
 
 User = get_user_model()
 WEBHOOK_URL = "https://example.com/booking/webhook"  # Replace with real endpoint
@@ -11,4 +19,113 @@ WEBHOOK_URL = "https://example.com/booking/webhook"  # Replace with real endpoin
 @receiver(post_save, sender=User)
 def logout_inactive_users(sender, instance, **kwargs):
     if not instance.is_active:
-        kill_user_sessions(instance)
\ No newline at end of file
+        kill_user_sessions(instance)
+
+@receiver(user_logged_in)
+def register_user_session(sender, request, user, **kwargs):
+    if request is not None and hasattr(request, 'session'):
+        register_session(request, user)
+
+@receiver(user_logged_out)
+def unregister_user_session(sender, request, user, **kwargs):
+    # logout() flushes the session right after this signal, which deletes the Session row.
+    if request is not None and getattr(request, 'session', None) and request.session.session_key:
+        unregister_sessions([request.session.session_key])
+
+# Booking fields that move the vehicle's next available date.
+AVAILABILITY_FIELDS = {'vehicle', 'status', 'start_date', 'end_date'}
+
+def refresh_vehicle_availability(vehicle_id):
+    vehicle = Vehicle.objects.with_availability().filter(pk=vehicle_id).first()
+    if vehicle:
+        vehicle.refresh_availability()
+        update_vehicle_row(vehicle)
+
+@receiver(post_save, sender=Booking)
+def booking_saved_refresh_availability(sender, instance, update_fields=None, **kwargs):
+    bookings_cache.invalidate_on_commit()
+    if update_fields is None or AVAILABILITY_FIELDS & set(update_fields):
+        refresh_vehicle_availability(instance.vehicle_id)
+        previous_vehicle_id = getattr(instance, '_loaded_vehicle_id', None)
+        if previous_vehicle_id and previous_vehicle_id != instance.vehicle_id:
+            refresh_vehicle_availability(previous_vehicle_id)
+    instance._loaded_vehicle_id = instance.vehicle_id
+
+@receiver(post_delete, sender=Booking)
+def booking_deleted_refresh_availability(sender, instance, **kwargs):
+    bookings_cache.invalidate_on_commit()
+    refresh_vehicle_availability(instance.vehicle_id)
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved_refresh_availability(sender, instance, **kwargs):
+    instance.refresh_availability()
+    update_vehicle_row(instance)
+
+# Vehicle fields rendered by the booking feeds, whose cached versions live in bookings_cache.
+FEED_VEHICLE_FIELDS = {'license_plate', 'vehicle_type'}
+
+@receiver(post_save, sender=Vehicle)
+def vehicle_saved_invalidate_feeds(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or FEED_VEHICLE_FIELDS & set(update_fields):
+        bookings_cache.invalidate_on_commit()
+
+@receiver(post_delete, sender=Vehicle)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def feed_source_changed(sender, **kwargs):
+    bookings_cache.invalidate_on_commit()
+
+@receiver(post_save, sender=EmailTemplate)
+@receiver(post_delete, sender=EmailTemplate)
+def email_template_changed(sender, instance, **kwargs):
+    invalidate_compiled_template(instance.pk)
+
+# User fields that decide whether a group member receives notifications.
+RECIPIENT_USER_FIELDS = {'email', 'is_active'}
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=EmailTemplate.send_to_groups.through)
+@receiver(m2m_changed, sender=EmailTemplate.send_to_users.through)
+@receiver(m2m_changed, sender=EmailTemplate.send_to_distribution_lists.through)
+def recipients_membership_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_recipients_generation()
+
+@receiver(post_save, sender=User)
+def recipients_user_saved(sender, instance, update_fields=None, **kwargs):
+    # Skip the last_login-only saves done on every login.
+    if update_fields is None or RECIPIENT_USER_FIELDS & set(update_fields):
+        bump_recipients_generation()
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=DistributionList)
+@receiver(post_delete, sender=DistributionList)
+def recipients_source_changed(sender, **kwargs):
+    bump_recipients_generation()
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_membership_revision()
+        if isinstance(instance, User):
+            instance.__dict__.pop('group_names', None)
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, **kwargs):
+    bump_membership_revision()
+
+@receiver(post_save, sender=AutomationSettings)
+@receiver(post_delete, sender=AutomationSettings)
+def automation_settings_changed(sender, **kwargs):
+    # After commit, so a reader can't cache the old row again before the new one is visible.
+    transaction.on_commit(lambda: settings_cache.delete(AutomationSettings.CACHE_KEY))
+
+@receiver(pre_migrate)
+def ensure_btree_gist(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """The booking overlap exclusion constraint needs btree_gist for the vehicle equality."""
+    connection = connections[using]
+    if sender.name == 'booking_app' and connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
@@ -0,0 +1,140 @@
+# booking_app/sweeps.py
+"""
+Bulk helpers for the nightly booking sweeps (check_pending_bookings,
+send_booking_reminders, ...).
+
+Status changes are done in one UPDATE ... RETURNING statement, and the
+notifications for the affected bookings are fanned out in chunks, either as a
+Celery group or on a bounded thread pool inside the calling process.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from celery import group
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .cache import bookings_cache
+from .models import Booking
+from .utils import send_system_notification
+
+logger = logging.getLogger('booking_app')
+
+SWEEP_CHUNK_SIZE = 50
+SWEEP_WORKERS = 4
+SWEEP_MODES = ('threads', 'celery', 'inline')
+
+
+def chunked(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def bulk_update_booking_status(bookings, status, **values):
+    """
+    Set `status` (and the extra column `values`) on every booking of the `bookings`
+    queryset in one UPDATE ... RETURNING. updated_at is set explicitly and the
+    vehicles' availability refreshed, since neither save() nor the post_save
+    signals run. Returns the ids of the updated bookings.
+    """
+    from .signals import refresh_vehicle_availability
+
+    meta = Booking._meta
+    values = {'status': status, 'updated_at': timezone.now(), **values}
+    assignments = ", ".join(f'"{meta.get_field(name).column}" = %s' for name in values)
+
+    where_sql, where_params = bookings.values('pk').query.sql_with_params()
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE "{meta.db_table}" SET {assignments} '
+            f'WHERE "{meta.pk.column}" IN ({where_sql}) '
+            f'RETURNING "{meta.pk.column}", "{meta.get_field("vehicle").column}"',
+            [*values.values(), *where_params],
+        )
+        rows = cursor.fetchall()
+
+    bookings_cache.invalidate_on_commit()
+    for vehicle_id in {vehicle_id for _, vehicle_id in rows}:
+        refresh_vehicle_availability(vehicle_id)
+    return sorted(pk for pk, _ in rows)
+
+
+def notify_bookings(event_trigger, booking_ids):
+    """
+    Queue `event_trigger` for each booking, with the bookings loaded in one query.
+    The outbox rows of the whole chunk are committed together, so the dispatcher is
+    woken once per chunk. Returns (sent, failed).
+    """
+    bookings = Booking.objects.filter(pk__in=booking_ids).select_related('user', 'vehicle')
+    sent = failed = 0
+    with transaction.atomic():
+        for booking in bookings:
+            try:
+                with transaction.atomic():
+                    # Templates and the salesperson recipient use "booking"; "booking_instance" is the legacy name.
+                    send_system_notification(
+                        event_trigger, context_data={"booking": booking, "booking_instance": booking},
+                    )
+                sent += 1
+            except Exception as e:
+                failed += 1
+                logger.error(f"Failed to queue '{event_trigger}' for Booking ID: {booking.pk}. Error: {e}")
+    return sent, failed
+
+
+def _notify_chunk_in_thread(event_trigger, booking_ids):
+    # Each worker thread has its own connection; don't leave it open after the sweep.
+    try:
+        return notify_bookings(event_trigger, booking_ids)
+    finally:
+        connection.close()
+
+
+def fan_out_booking_notifications(event_trigger, booking_ids, mode='threads', workers=SWEEP_WORKERS,
+                                  chunk_size=SWEEP_CHUNK_SIZE, progress=None):
+    """
+    Send `event_trigger` for `booking_ids` in chunks of `chunk_size`.
+
+    - threads: at most `workers` chunks run at once in this process;
+    - celery: one send_booking_notifications_task per chunk, started as a group
+      (concurrency is bounded by the worker pool);
+    - inline: chunks run one after the other.
+
+    `progress(done, total, sent, failed)` is called after each chunk, or once the
+    group is dispatched in celery mode. Returns (sent, failed); in celery mode sent
+    is the number of bookings handed to the workers.
+    """
+    chunks = chunked(booking_ids, chunk_size)
+    total = len(chunks)
+    sent = failed = 0
+    if not chunks:
+        return sent, failed
+
+    if mode == 'celery':
+        from .tasks import send_booking_notifications_task
+        group(send_booking_notifications_task.s(event_trigger, chunk) for chunk in chunks).apply_async()
+        sent = len(booking_ids)
+        if progress:
+            progress(total, total, sent, failed)
+        return sent, failed
+
+    if mode == 'inline':
+        for done, chunk in enumerate(chunks, 1):
+            chunk_sent, chunk_failed = notify_bookings(event_trigger, chunk)
+            sent, failed = sent + chunk_sent, failed + chunk_failed
+            if progress:
+                progress(done, total, sent, failed)
+        return sent, failed
+
+    if mode != 'threads':
+        raise ValueError(f"Unknown sweep mode '{mode}'")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [executor.submit(_notify_chunk_in_thread, event_trigger, chunk) for chunk in chunks]
+        for done, future in enumerate(as_completed(futures), 1):
+            chunk_sent, chunk_failed = future.result()
+            sent, failed = sent + chunk_sent, failed + chunk_failed
+            if progress:
+                progress(done, total, sent, failed)
+    return sent, failed
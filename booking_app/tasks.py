@@ -5,7 +5,8 @@ from django.utils.timezone import now
 from datetime import timedelta
 
 from booking_app.services import send_booking_to_webservice
-from booking_app.utils import send_system_notification, sanitize_context
+from booking_app.notifications import hydrate_notification_envelope, is_notification_envelope
+from booking_app.utils import send_system_notification
 import logging
 
 logger = logging.getLogger("booking_app")
@@ -14,20 +15,49 @@ logger = logging.getLogger("booking_app")
 def send_system_notification_task(event_trigger, context_data=None, test_email_recipient=None):
     """
     Background task to send ANY system notification asynchronously.
+    `context_data` is normally an envelope from build_notification_envelope().
     """
 
     try:
-        safe_context = sanitize_context(context_data)
+        if is_notification_envelope(context_data):
+            context_data = hydrate_notification_envelope(context_data)
         send_system_notification(
             event_trigger=event_trigger,
-            context_data=safe_context,
+            context_data=context_data,
             test_email_recipient=test_email_recipient
         )
-        logger.info(f"Notification '{event_trigger}' sent successfully via Celery")
+        logger.info(f"Notification '{event_trigger}' queued successfully via Celery")
     except Exception as e:
         logger.error(f"Failed to send system notification '{event_trigger}': {e}", exc_info=True)
 
 
+@shared_task
+def send_booking_notifications_task(event_trigger, booking_ids):
+    """One chunk of a booking sweep fan-out: queue `event_trigger` for each booking."""
+    from booking_app.sweeps import notify_bookings
+    sent, failed = notify_bookings(event_trigger, booking_ids)
+    logger.info(f"Notification '{event_trigger}': {sent} queued, {failed} failed")
+    return sent, failed
+
+
+@shared_task
+def dispatch_email_outbox_task():
+    """Send the queued notification emails that are due."""
+    from booking_app.outbox import dispatch_email_outbox
+    sent = dispatch_email_outbox()
+    if sent:
+        logger.info(f"Email outbox: processed {sent} messages")
+    return sent
+
+
+@shared_task
+def run_periodic_job_task(name):
+    """Beat entry point of the periodic jobs; see booking_app.periodic."""
+    from booking_app.periodic import run_periodic_job
+    run = run_periodic_job(name)
+    return run.status if run else None
+
+
 @shared_task
 def send_daily_error_report():
     """Collect errors from log file and send them to admins once per day."""
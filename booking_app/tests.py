@@ -0,0 +1,51 @@
+# booking_app/tests.py
+import pytest
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from booking_app.models import Vehicle
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@pytest.fixture
+def group_leader(client, settings, django_user_model):
+    settings.CACHES = LOCMEM_CACHES
+    settings.MIDDLEWARE = [m for m in settings.MIDDLEWARE if not m.endswith('LicenseCheckMiddleware')]
+    for i, vehicle_type in enumerate(('HEAVY', 'HEAVY', 'LIGHT', 'APV')):
+        Vehicle.objects.create(license_plate=f'AA-00-{i:02d}', vehicle_type=vehicle_type)
+    user = django_user_model.objects.create_user(username='leader', password='pw')
+    user.groups.add(Group.objects.create(name='tlheavy'))
+    client.force_login(user)
+    return user
+
+
+def group_queries(captured):
+    return [query['sql'] for query in captured.captured_queries if '"auth_group"' in query['sql']]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url_name', ['booking_app:vehicle_list', 'booking_app:group_calendar'])
+def test_group_membership_is_resolved_once_per_request(client, group_leader, url_name):
+    # Every role check of the view, the context processor and the templates shares one lookup.
+    with CaptureQueriesContext(connection) as captured:
+        response = client.get(reverse(url_name))
+    assert response.status_code == 200
+    assert len(group_queries(captured)) == 1
+
+    # Later requests read the group names from the roles cache.
+    with CaptureQueriesContext(connection) as captured:
+        client.get(reverse(url_name))
+    assert group_queries(captured) == []
+
+
+@pytest.mark.django_db
+def test_group_change_invalidates_cached_roles(client, group_leader):
+    client.get(reverse('booking_app:vehicle_list'))
+    group_leader.groups.add(Group.objects.create(name='Booking Admin'))
+
+    with CaptureQueriesContext(connection) as captured:
+        client.get(reverse('booking_app:vehicle_list'))
+    assert len(group_queries(captured)) == 1
@@ -0,0 +1,114 @@
+# booking_app/transitions.py
+"""
+Date-driven booking status transitions.
+
+Each transition is declared once (source statuses, a predicate on the booking
+dates, target status and the notification event) and applied as one set-based
+UPDATE over every booking that qualifies. The predicates compare against the
+last completed day rather than matching it exactly, so a missed nightly run is
+caught up by the next one.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.db import IntegrityError
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Booking, is_occupancy_conflict
+from .sweeps import bulk_update_booking_status
+
+logger = logging.getLogger('booking_app')
+
+
+class BookingTransition:
+    def __init__(self, name, sources, predicate, target, event):
+        self.name = name
+        self.sources = tuple(sources)
+        self.predicate = predicate  # day -> Q over the bookings due on or before that day
+        self.target = target
+        self.event = event
+
+    def __repr__(self):
+        return f"<BookingTransition {self.name}: {'/'.join(self.sources)} -> {self.target}>"
+
+    def due(self, day):
+        return Booking.objects.filter(self.predicate(day), status__in=self.sources)
+
+
+# Applied in this order: a booking whose whole period was missed goes straight to
+# pending_final_km instead of passing through ongoing.
+TRANSITIONS = (
+    BookingTransition(
+        'ended', ('confirmed', 'ongoing'),
+        lambda day: Q(end_date__lte=day),
+        'pending_final_km', 'booking_ended_pending_km',
+    ),
+    BookingTransition(
+        'ongoing', ('confirmed',),
+        lambda day: Q(start_date__lte=day, end_date__gt=day),
+        'ongoing', 'booking_ongoing',
+    ),
+)
+
+TRANSITIONS_BY_NAME = {transition.name: transition for transition in TRANSITIONS}
+
+
+def _enqueue_notifications(transition, booking_ids):
+    from .tasks import send_booking_notifications_task
+    try:
+        send_booking_notifications_task.delay(transition.event, booking_ids)
+    except Exception as e:
+        logger.error(f"Could not enqueue '{transition.event}' for {len(booking_ids)} bookings: {e}")
+
+
+def _apply_row_by_row(transition, due):
+    """
+    Fallback when the set-based UPDATE hits the overlap constraint: an 'ongoing'
+    booking is not blocking, so it may overlap another booking and cannot become
+    pending_final_km until someone fixes it. Move the others one by one and skip it.
+    """
+    booking_ids = []
+    for pk in due.order_by('pk').values_list('pk', flat=True):
+        try:
+            booking_ids += bulk_update_booking_status(Booking.objects.filter(pk=pk), transition.target)
+        except IntegrityError as e:
+            if not is_occupancy_conflict(e):
+                raise
+            logger.error(
+                f"Transition '{transition.name}': Booking ID {pk} overlaps another active booking; "
+                f"left in its current status"
+            )
+    return booking_ids
+
+
+def apply_transition(transition, day=None):
+    """
+    Move every booking due on or before `day` (default: yesterday) to the
+    transition's target status and enqueue one notification job for all of them.
+    Returns the ids of the moved bookings.
+    """
+    if day is None:
+        day = timezone.now().date() - timedelta(days=1)
+
+    due = transition.due(day)
+    try:
+        booking_ids = bulk_update_booking_status(due, transition.target)
+    except IntegrityError as e:
+        if not is_occupancy_conflict(e):
+            raise
+        booking_ids = _apply_row_by_row(transition, due)
+    if booking_ids:
+        logger.info(f"Transition '{transition.name}': moved {len(booking_ids)} bookings to '{transition.target}'")
+        _enqueue_notifications(transition, booking_ids)
+    return booking_ids
+
+
+def run_transitions(names=None, day=None):
+    """Apply the named transitions (all by default) in declaration order; returns {name: ids}."""
+    return {
+        transition.name: apply_transition(transition, day)
+        for transition in TRANSITIONS
+        if names is None or transition.name in names
+    }
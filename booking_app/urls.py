@@ -37,6 +37,7 @@ urlpatterns = [
     path("group-bookings/<int:booking_pk>/send/",views.send_group_booking,name="send_group_booking",),
     path('group-dashboard/reports/', views.group_reports_view, name='group_reports'),
     path('group-dashboard/calendar/', views.group_calendar_view, name='group_calendar'),
+    path('group-dashboard/calendar/api/', views.group_calendar_api_view, name='group_calendar_api'),
     path('group-dashboard/client-history/<str:tax_number>/', views.client_booking_history_view, name='client_booking_history'),
 
     # Admin Dashboard & Management URLs
@@ -98,6 +99,7 @@ urlpatterns = [
 
     # API URLs
     path('api/bookings/', views.booking_api_view, name='booking_api'),
+    path('api/fleet-occupancy/', views.fleet_occupancy_api_view, name='fleet_occupancy_api'),
     path('api/check-client/', views.check_client_in_db_view, name='check_client_in_db'),
     path('api/get-company-details/', views.get_company_details_view, name='get_company_details'),
     path('api/validate-vat/', views.validate_vat_view, name='validate_vat'),
@@ -1,21 +1,25 @@
 # C:\Users\f19705e\PycharmProjects\truck_booking_app\booking_app\utils.py
 
 import logging
-from datetime import timedelta
+import threading
+import time
 
-import msal
 import json
 import requests
 from django.conf import settings
 from django.contrib.sessions.models import Session
-from django.core.cache import cache
 from django.db import transaction
-from django.forms.models import model_to_dict
-from django.template import Template, Context
+from django.db.models import Max
+from django.template import Context
 from django.utils import timezone
-from django.utils.functional import SimpleLazyObject
 
-from .models import EmailTemplate, EmailLog, Transport
+from .business_calendar import get_business_calendar
+from .cache import external_cache
+from .graph import GRAPH_BASE_URL, GRAPH_BATCH_LIMIT, GRAPH_TIMEOUT, get_http_session, get_token_provider
+from .models import EmailTemplate, EmailOutbox, Transport, UserSession
+from .notifications import get_compiled_template, get_template_recipients
+from .presence import invalidate_presence
+from .session_registry import unregister_sessions
 
 logger = logging.getLogger('booking_app')
 
@@ -26,35 +30,28 @@ logger = logging.getLogger('booking_app')
 
 def get_graph_api_access_token():
     """
-    Acquires an access token from Microsoft Identity Platform.
+    Returns an access token for Microsoft Graph from the process-wide token
+    provider, which reuses the token until shortly before it expires.
     """
-    # --- FINAL DEBUGGING STEP: Inspect credentials before use ---
-    client_id = settings.MS_GRAPH_CLIENT_ID
-    client_secret = settings.MS_GRAPH_CLIENT_SECRET
-    tenant_id = settings.MS_GRAPH_TENANT_ID
-
-    authority = f"https://login.microsoftonline.com/{tenant_id}"
-    app = msal.ConfidentialClientApplication(
-        client_id=client_id,
-        authority=authority,
-        client_credential=client_secret,
-    )
+    return get_token_provider().get_token()
 
-    scopes = ["https://graph.microsoft.com/.default"]
-    result = app.acquire_token_silent(scopes=scopes, account=None)
 
-    if not result:
-        logger.info("No cached token found. Acquiring a new token from AAD.")
-        result = app.acquire_token_for_client(scopes=scopes)
+def _graph_mail_payload(subject, body, recipient_list):
+    """The sendMail JSON payload for one message."""
+    # Format the recipient list for the Graph API JSON payload
+    to_recipients_json = [{"emailAddress": {"address": email}} for email in recipient_list]
 
-    if "access_token" in result:
-        return result['access_token']
-    else:
-        # Also print the error from MSAL if it fails
-        error_description = result.get("error_description", "No error description from MSAL.")
-        logger.error(f"Failed to acquire token: {error_description}")
-        #print(f"--- MSAL ERROR: {error_description} ---")
-        return None
+    return {
+        "message": {
+            "subject": subject,
+            "body": {
+                "contentType": "HTML",
+                "content": body
+            },
+            "toRecipients": to_recipients_json
+        },
+        "saveToSentItems": "true"
+    }
 
 
 def send_email_with_graph_api(subject, body, recipient_list):
@@ -75,58 +72,115 @@ def send_email_with_graph_api(subject, body, recipient_list):
 
     # Use the sender email from your settings.py
     sender_email = settings.MS_GRAPH_SENDER_EMAIL
-    url = f"https://graph.microsoft.com/v1.0/users/{sender_email}/sendMail"
+    url = f"{GRAPH_BASE_URL}/users/{sender_email}/sendMail"
 
     headers = {
         'Authorization': f'Bearer {access_token}',
         'Content-Type': 'application/json'
     }
 
-    # Format the recipient list for the Graph API JSON payload
-    to_recipients_json = [{"emailAddress": {"address": email}} for email in recipient_list]
-
-    email_payload = {
-        "message": {
-            "subject": subject,
-            "body": {
-                "contentType": "HTML",
-                "content": body
-            },
-            "toRecipients": to_recipients_json
-        },
-        "saveToSentItems": "true"
-    }
-
-    response = requests.post(url, headers=headers, json=email_payload)
+    response = get_http_session().post(
+        url, headers=headers, json=_graph_mail_payload(subject, body, recipient_list), timeout=GRAPH_TIMEOUT,
+    )
 
     if response.status_code == 202:  # 202 Accepted is the success code for sendMail
         return True, "Email sent successfully via MS Graph."
     else:
+        if response.status_code == 401:
+            get_token_provider().invalidate()
         error_details = f"Status Code: {response.status_code} - Body: {response.text}"
         return False, error_details
 
 
+def send_emails_with_graph_api(messages):
+    """
+    Sends several emails, packing up to 20 sendMail requests into each Graph $batch call.
+
+    Args:
+        messages (list): dicts with 'subject', 'body' and 'recipient_list' keys.
+
+    Returns:
+        list: one (bool, str) tuple per message, in the order given.
+    """
+    if len(messages) <= 1:
+        return [send_email_with_graph_api(**message) for message in messages]
+
+    access_token = get_graph_api_access_token()
+    if not access_token:
+        return [(False, "Failed to get API access token.")] * len(messages)
+
+    sender_email = settings.MS_GRAPH_SENDER_EMAIL
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Content-Type': 'application/json'
+    }
+
+    results = []
+    for offset in range(0, len(messages), GRAPH_BATCH_LIMIT):
+        chunk = messages[offset:offset + GRAPH_BATCH_LIMIT]
+        batch_payload = {
+            "requests": [
+                {
+                    "id": str(i),
+                    "method": "POST",
+                    "url": f"/users/{sender_email}/sendMail",
+                    "headers": {"Content-Type": "application/json"},
+                    "body": _graph_mail_payload(**message),
+                }
+                for i, message in enumerate(chunk)
+            ]
+        }
+
+        try:
+            response = get_http_session().post(
+                f"{GRAPH_BASE_URL}/$batch", headers=headers, json=batch_payload, timeout=GRAPH_TIMEOUT,
+            )
+        except requests.exceptions.RequestException as e:
+            results.extend([(False, str(e))] * len(chunk))
+            continue
+
+        if response.status_code != 200:
+            if response.status_code == 401:
+                get_token_provider().invalidate()
+            error_details = f"Status Code: {response.status_code} - Body: {response.text}"
+            results.extend([(False, error_details)] * len(chunk))
+            continue
+
+        # Items come back in any order; match them to the messages by id.
+        responses = {item.get("id"): item for item in response.json().get("responses", [])}
+        for i in range(len(chunk)):
+            item = responses.get(str(i))
+            if item is None:
+                results.append((False, "No response for this message in the $batch reply."))
+            elif item.get("status") == 202:
+                results.append((True, "Email sent successfully via MS Graph."))
+            else:
+                results.append((False, f"Status Code: {item.get('status')} - Body: {json.dumps(item.get('body'))}"))
+    return results
+
+
 # ==============================================================================
 # UNCHANGED UTILITY FUNCTIONS
 # ==============================================================================
 
 def add_business_days(start_date, num_business_days):
-    current_date = start_date
-    days_added = 0
-    while days_added < num_business_days:
-        current_date += timedelta(days=1)
-        if current_date.weekday() < 5:  # Check if it's a weekday (Monday-Friday)
-            days_added += 1
-    return current_date
+    """Date `num_business_days` working days after `start_date` (weekends and holidays skipped)."""
+    return get_business_calendar().add(start_date, num_business_days)
 
 
 def subtract_business_days(from_date, days):
-    current_date = from_date
-    while days > 0:
-        current_date -= timedelta(days=1)
-        if current_date.weekday() < 5:
-            days -= 1
-    return current_date
+    """Date `days` working days before `from_date` (weekends and holidays skipped)."""
+    return get_business_calendar().subtract(from_date, days)
+
+
+def add_business_days_batch(dates, num_business_days):
+    """Vectorised add_business_days: shifts every date of `dates` at once."""
+    return get_business_calendar().add_many(dates, num_business_days)
+
+
+def subtract_business_days_batch(dates, days):
+    """Vectorised subtract_business_days: shifts every date of `dates` at once."""
+    return get_business_calendar().subtract_many(dates, days)
 
 
 # ==============================================================================
@@ -138,18 +192,21 @@ def send_system_notification(event_trigger, context_data=None, test_email_recipi
     Generic notification sender for ALL system events.
     - Looks up EmailTemplate by event_trigger
     - Renders with given context
-    - Sends via Graph API + logs result
+    - Queues the messages in EmailOutbox (sent and logged by the outbox dispatcher)
     """
 
-    context_data = sanitize_context(context_data)
-    context = Context(context_data or {})
+    context_data = context_data or {}
+    context = Context(context_data)
 
-    template_list = EmailTemplate.objects.filter(event_trigger=event_trigger, is_active=True)
+    template_list = list(EmailTemplate.objects.filter(event_trigger=event_trigger, is_active=True))
 
-    if not template_list.exists():
+    if not template_list:
         logger.info(f"No active email templates for event '{event_trigger}'")
         return
 
+    template_recipients = {} if test_email_recipient else get_template_recipients(template_list)
+
+    outgoing = []
     for template_obj in template_list:
         recipient_list = set()
 
@@ -159,71 +216,51 @@ def send_system_notification(event_trigger, context_data=None, test_email_recipi
             if template_obj.send_to_salesperson and context_data.get("booking") and hasattr(context_data["booking"], "user"):
                 recipient_list.add(context_data["booking"].user.email)
 
-            if template_obj.send_to_groups.exists():
-                for group in template_obj.send_to_groups.all():
-                    for user in group.user_set.filter(is_active=True, email__isnull=False):
-                        recipient_list.add(user.email)
-
-            if template_obj.send_to_users.exists():
-                for user in template_obj.send_to_users.filter(is_active=True, email__isnull=False):
-                    recipient_list.add(user.email)
-
-            if template_obj.send_to_distribution_lists.exists():
-                for dl in template_obj.send_to_distribution_lists.all():
-                    recipient_list.update(dl.get_emails_as_list())
+            recipient_list.update(template_recipients.get(template_obj.pk, ()))
 
         if not recipient_list:
             logger.info(f"Template '{template_obj.name}' for event '{event_trigger}' has no recipients.")
             continue
 
-        subject_template = Template(template_obj.subject)
-        body_template = Template(template_obj.body)
-
         try:
+            subject_template, body_template = get_compiled_template(template_obj)
             rendered_subject = subject_template.render(context)
             rendered_body = body_template.render(context)
         except Exception as e:
             logger.error(f"Template render error for '{template_obj.name}': {e}")
             continue
 
-        try:
-            success, response_message = send_email_with_graph_api(
-                subject=rendered_subject,
-                body=rendered_body,
-                recipient_list=list(recipient_list),
+        outgoing.append({
+            'subject': rendered_subject,
+            'body': rendered_body,
+            'recipient_list': list(recipient_list),
+        })
+
+    if not outgoing:
+        return
+
+    # Queue in the caller's transaction; the dispatcher sends once it commits.
+    with transaction.atomic():
+        EmailOutbox.objects.bulk_create([
+            EmailOutbox(
+                event_trigger=event_trigger,
+                subject=message['subject'],
+                body=message['body'],
+                recipients=message['recipient_list'],
             )
-            status = "sent" if success else "failed"
-            for r in recipient_list:
-                EmailLog.objects.create(
-                    recipient=r,
-                    subject=rendered_subject,
-                    status=status,
-                    error_message=None if success else response_message
-                )
-        except Exception as e:
-            for r in recipient_list:
-                EmailLog.objects.create(
-                    recipient=r,
-                    subject=rendered_subject,
-                    status="failed",
-                    error_message=str(e)
-                )
-
-def sanitize_context(context_data):
-    safe_data = {}
-    for key, value in (context_data or {}).items():
-        if isinstance(value, SimpleLazyObject):
-            value = value.__wrapped__  # unwrap lazy object
-
-        if hasattr(value, "_meta"):  # Django model
-            safe_data[key] = model_to_dict(value)
-        elif isinstance(value, (list, tuple)):
-            safe_data[key] = [
-                model_to_dict(v) if hasattr(v, "_meta") else str(v) for v in value
-            ]
-        else:
-            safe_data[key] = str(value)
-    return safe_data
+            for message in outgoing
+        ])
+        transaction.on_commit(_trigger_outbox_dispatch)
+
+
+def _trigger_outbox_dispatch():
+    from .tasks import dispatch_email_outbox_task
+    try:
+        dispatch_email_outbox_task.delay()
+    except Exception as e:
+        # The periodic dispatcher run picks the messages up anyway.
+        logger.warning(f"Could not trigger the email outbox dispatcher: {e}")
+
 
 # ==============================================================================
 # UNCHANGED COMPANY CHECKER FUNCTION
@@ -251,8 +288,25 @@ def check_company_by_crc(crc: str):
 # LICENSING CLIENT FUNCTIONS
 # ==============================================================================
 
-# The key we'll use to store the license status in Django's cache
-LICENSE_CACHE_KEY = "license_status_cache"
+# The key we'll use to store the license status in the 'external' cache namespace.
+# The entry is {"status", "verified_at", "checked_at", "degraded"}; it never expires,
+# freshness is decided from the timestamps so a stale entry can still be served.
+LICENSE_CACHE_KEY = "license_status"
+LICENSE_REFRESH_LOCK_KEY = "license_status:refresh"
+LICENSE_REFRESH_LOCK_TIMEOUT = 30
+# When a request first found no status at all; bounds how long LICENSE_PENDING_STATUS is served.
+LICENSE_PENDING_SINCE_KEY = "license_status:pending_since"
+
+# Served while the very first check is still running (for at most
+# LICENSE_PENDING_PERIOD), so no request waits on it.
+LICENSE_PENDING_STATUS = {"valid": True, "reason": "pending_verification"}
+LICENSE_PENDING_EXPIRED_STATUS = {"valid": False, "reason": "verification_pending"}
+
+# One background refresh per process at a time, and at most one attempt per
+# LICENSE_RETRY_INTERVAL, so a stale entry or a failing server does not start a
+# thread (and a Redis round trip) on every request.
+_license_refresh_running = threading.Lock()
+_license_refresh_not_before = 0.0
 
 
 def verify_license_with_server():
@@ -276,23 +330,104 @@ def verify_license_with_server():
         return {"valid": False, "reason": "server_unreachable"}
 
 
-def get_license_status():
+def refresh_license_status():
     """
-    Gets the license status, using a cache to avoid frequent API calls.
-    This provides a "grace period" if the license server is temporarily down.
+    Call the license server now and store the answer; returns the status to serve.
+    If the server is unreachable the last known status is kept (marked degraded)
+    and served until LICENSE_GRACE_PERIOD has passed since it was verified.
     """
-    # 1. Try to get the status from the cache first
-    cached_status = cache.get(LICENSE_CACHE_KEY)
-    if cached_status:
-        return cached_status
-
-    # 2. If not in cache, call the license server
     status = verify_license_with_server()
+    now = time.time()
+    previous = external_cache.get(LICENSE_CACHE_KEY)
+
+    if status.get("reason") == "server_unreachable":
+        entry = {**(previous or {"status": status, "verified_at": now}), "checked_at": now, "degraded": True}
+    else:
+        entry = {"status": status, "verified_at": now, "checked_at": now, "degraded": False}
+
+    external_cache.set(LICENSE_CACHE_KEY, entry)
+    external_cache.delete(LICENSE_PENDING_SINCE_KEY)
+    return _served_license_status(entry, now)
 
-    # 3. Store the result in the cache for 1 hour (3600 seconds)
-    cache.set(LICENSE_CACHE_KEY, status, 3600)
 
-    return status
+def refresh_license_status_once(raise_errors=False):
+    """refresh_license_status() unless another process is already refreshing; returns whether it ran."""
+    if not external_cache.add(LICENSE_REFRESH_LOCK_KEY, True, LICENSE_REFRESH_LOCK_TIMEOUT):
+        return False
+    try:
+        refresh_license_status()
+    except Exception as e:
+        if raise_errors:
+            raise
+        logger.error(f"License status refresh failed: {e}", exc_info=True)
+    finally:
+        external_cache.delete(LICENSE_REFRESH_LOCK_KEY)
+    return True
+
+
+def _served_license_status(entry, now):
+    grace = getattr(settings, "LICENSE_GRACE_PERIOD", 24 * 60 * 60)
+    if entry["degraded"] and entry["status"].get("valid") and now - entry["verified_at"] > grace:
+        return {"valid": False, "reason": "grace_period_expired"}
+    return entry["status"]
+
+
+def _license_needs_refresh(entry, now):
+    if entry["degraded"]:
+        interval = getattr(settings, "LICENSE_RETRY_INTERVAL", 60)
+    else:
+        # Refresh ahead of expiry, so the status served is never older than the TTL.
+        interval = getattr(settings, "LICENSE_STATUS_TTL", 3600) - getattr(settings, "LICENSE_REFRESH_AHEAD", 300)
+    return now - entry["checked_at"] >= interval
+
+
+def _run_license_refresh():
+    try:
+        refresh_license_status_once()
+    finally:
+        _license_refresh_running.release()
+
+
+def _refresh_license_in_background(now):
+    global _license_refresh_not_before
+    if now < _license_refresh_not_before or not _license_refresh_running.acquire(blocking=False):
+        return
+    _license_refresh_not_before = now + getattr(settings, "LICENSE_RETRY_INTERVAL", 60)
+    try:
+        threading.Thread(target=_run_license_refresh, name="license-refresh", daemon=True).start()
+    except Exception:
+        _license_refresh_running.release()
+        raise
+
+
+def _pending_license_status(now):
+    """LICENSE_PENDING_STATUS, until nothing has been cached for LICENSE_PENDING_PERIOD."""
+    if external_cache.add(LICENSE_PENDING_SINCE_KEY, now):
+        pending_since = now
+    else:
+        pending_since = external_cache.get(LICENSE_PENDING_SINCE_KEY, now)
+    if now - pending_since > getattr(settings, "LICENSE_PENDING_PERIOD", 5 * 60):
+        return LICENSE_PENDING_EXPIRED_STATUS
+    return LICENSE_PENDING_STATUS
+
+
+def get_license_status():
+    """
+    Gets the license status from the shared cache (stale-while-revalidate).
+    A stale entry is still returned while a background thread (at most one per
+    process) asks the license server; the 'refresh-license-status' periodic job
+    normally keeps the entry fresh anyway, so no request waits on the server.
+    """
+    entry = external_cache.get(LICENSE_CACHE_KEY)
+    now = time.time()
+
+    if entry is None:
+        _refresh_license_in_background(now)
+        return _pending_license_status(now)
+
+    if _license_needs_refresh(entry, now):
+        _refresh_license_in_background(now)
+    return _served_license_status(entry, now)
 
 
 def is_license_valid():
@@ -315,62 +450,38 @@ def get_license_tier():
 
 def get_user_sessions(user):
     """
-    Return list of session info dicts for given user.
-    Each dict: {session_key, expire_date, session_data, created_at, last_activity, ip, user_agent}
-    Note: created_at/last_activity/ip/user_agent are present only if you populate them in middleware.
+    Return list of session info dicts for given user, most recently active first.
+    Each dict: {session_key, expire_date, created_at, last_activity, ip, user_agent}
     """
-    sessions = []
-    qs = Session.objects.filter(expire_date__gt=timezone.now())
-    for s in qs:
-        data = s.get_decoded()
-        if str(user.pk) == str(data.get('_auth_user_id')):
-            info = {
-                "session_key": s.session_key,
-                "expire_date": s.expire_date,
-                "session_data": data,
-                # optional keys populated by middleware:
-                "created_at": data.get('session_created_at'),
-                "last_activity": data.get('last_activity'),
-                "ip": data.get('session_ip'),
-                "user_agent": data.get('session_user_agent'),
-            }
-            sessions.append(info)
-    return sessions
+    return list(
+        UserSession.objects
+        .filter(user=user, expire_date__gt=timezone.now())
+        .order_by('-last_activity')
+        .values('session_key', 'expire_date', 'created_at', 'last_activity', 'ip', 'user_agent')
+    )
 
 def is_user_logged_in(user):
     """Return True if there is any non-expired session tied to user."""
-    return len(get_user_sessions(user)) > 0
+    return UserSession.objects.filter(user=user, expire_date__gt=timezone.now()).exists()
 
 def kill_session_by_key(session_key):
-    Session.objects.filter(session_key=session_key).delete()
+    unregister_sessions([session_key])
 
 def kill_user_sessions(user):
     """Delete all sessions for a specific user."""
-    for s in Session.objects.all():
-        data = s.get_decoded()
-        if data.get('_auth_user_id') == str(user.pk):
-            s.delete()
+    unregister_sessions(UserSession.objects.filter(user=user).values_list('session_key', flat=True))
 
 def kill_all_sessions():
+    user_ids = set(UserSession.objects.values_list('user_id', flat=True))
     Session.objects.all().delete()
+    UserSession.objects.all().delete()
+    invalidate_presence(user_ids)
 
 def get_last_activity_for_user(user):
-    """Return last_activity ISO string (or None) among all sessions of a user."""
-    from django.contrib.sessions.models import Session
-    sessions = Session.objects.filter(expire_date__gt=timezone.now())
-    last_seen = None
-    for s in sessions:
-        data = s.get_decoded()
-        if str(user.pk) == str(data.get('_auth_user_id')):
-            la = data.get("last_activity")
-            if la:
-                try:
-                    ts = timezone.datetime.fromisoformat(la)
-                    if not last_seen or ts > last_seen:
-                        last_seen = ts
-                except Exception:
-                    continue
-    return last_seen
+    """Return the last activity (datetime or None) among all live sessions of a user."""
+    return UserSession.objects.filter(
+        user=user, expire_date__gt=timezone.now()
+    ).aggregate(last_seen=Max('last_activity'))['last_seen']
 
 def _booking_start_location(booking):
     # Try common names in order; adjust to your real field names if needed.
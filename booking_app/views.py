@@ -1,11 +1,12 @@
 import csv
+import hashlib
 import io
 import os
 import re
 import json
 import logging
 import traceback
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
 import requests
 from bs4 import BeautifulSoup
@@ -13,23 +14,30 @@ from django.conf import settings
 from django.contrib.auth.forms import AuthenticationForm, SetPasswordForm, PasswordChangeForm
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.exceptions import ValidationError
-from django.db.models import Q, Prefetch, Count
-from django.db.models.functions import TruncMonth
+from django.db.models import Q, Count, Max, Value
+from django.db.models.functions import Greatest, TruncMonth
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlencode
 from django.utils.crypto import get_random_string
-from django.utils.translation import gettext as _
+from django.utils.dateparse import parse_date
+from django.utils.translation import gettext as _, get_language
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth import get_user_model, login, logout, update_session_auth_hash
 from django.contrib.auth.models import Group
 from django.core.paginator import Paginator
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from django.views.decorators.http import condition
 
 from . import services
-from .api.serializers import safe_context
+from .occupancy import FleetOccupancy, HORIZON_DAYS
+from .cache import bookings_cache
+from .notifications import build_notification_envelope
+from .presence import get_presence_map
 from .models import (
     Vehicle,
     Location,
@@ -41,6 +49,8 @@ from .models import (
     Client,
     InactiveUser,
     Transport,
+    compute_availability_slots,
+    is_occupancy_conflict,
 )
 from .forms import (
     BookingForm, VehicleCreateForm, VehicleEditForm, LocationCreateForm,
@@ -49,10 +59,11 @@ from .forms import (
     BookingFilterForm, VehicleImportForm
 )
 from .services import send_booking_to_webservice
+from .session_registry import rotate_session
 from booking_app.tasks import send_system_notification_task
 from .utils import (
-    add_business_days, subtract_business_days, kill_user_sessions, kill_all_sessions,
-    kill_session_by_key, get_user_sessions, get_last_activity_for_user, is_user_logged_in,
+    add_business_days_batch, subtract_business_days_batch, kill_user_sessions, kill_all_sessions,
+    kill_session_by_key, get_user_sessions,
     compute_transport_for_booking)
 
 logger = logging.getLogger(__name__)
@@ -63,20 +74,10 @@ User = get_user_model()
 # ------------------------------
 def is_admin(user): return user.is_authenticated and user.is_admin_member
 def is_booking_manager(user): return user.is_authenticated and user.is_booking_admin_member
-def is_group_leader(user): return user.groups.filter(name__in=['tlheavy', 'tllight', 'tlapv', 'sd']).exists() or (
-        user.is_authenticated and user.is_booking_admin_member)
+def is_group_leader(user): return user.is_authenticated and user.is_group_leader
 
 def get_managed_vehicle_types(user):
-    user_groups = user.groups.values_list('name', flat=True)
-    vehicle_types = []
-    if user.is_booking_admin_member:
-        vehicle_types.extend(['LIGHT', 'HEAVY', 'APV'])
-    else:
-        if 'sd' in user_groups: vehicle_types.extend(['LIGHT', 'HEAVY'])
-        if 'tlheavy' in user_groups: vehicle_types.append('HEAVY')
-        if 'tllight' in user_groups: vehicle_types.append('LIGHT')
-        if 'tlapv' in user_groups: vehicle_types.append('APV')
-    return list(set(vehicle_types))
+    return user.managed_vehicle_types
 
 # ------------------------------
 # Core / Auth Views
@@ -127,20 +128,31 @@ def book_vehicle_view(request, vehicle_pk):
     else:
         form = BookingForm(vehicle=vehicle, is_create_page=True, crc_is_mandatory=crc_is_mandatory)
 
-    unavailable_statuses = ['pending', 'pending_contract', 'confirmed', 'pending_final_km']
-    all_bookings = Booking.objects.filter(vehicle=vehicle, status__in=unavailable_statuses).order_by('start_date')
+    return render(request, 'book_vehicle.html', _book_vehicle_context(form, vehicle, crc_is_mandatory))
+
+
+def _book_vehicle_context(form, vehicle, crc_is_mandatory=None, **extra):
+    """Context of book_vehicle.html: the form plus the date picker's blocked ranges and the CRC flag."""
+    if crc_is_mandatory is None:
+        crc_is_mandatory = AutomationSettings.load().require_crc_verification
+    all_bookings = list(
+        Booking.objects.filter(vehicle=vehicle, status__in=Booking.UNAVAILABLE_STATUSES)
+        .order_by('start_date')
+        .values_list('start_date', 'end_date')
+    )
+    range_starts = subtract_business_days_batch([start for start, _end in all_bookings], 3)
+    range_ends = add_business_days_batch([end for _start, end in all_bookings], 3)
     unavailable_ranges = [
-        {"start": subtract_business_days(b.start_date, 3).strftime('%Y-%m-%d'),
-         "end": add_business_days(b.end_date, 3).strftime('%Y-%m-%d')}
-        for b in all_bookings
+        {"start": start.strftime('%Y-%m-%d'), "end": end.strftime('%Y-%m-%d')}
+        for start, end in zip(range_starts, range_ends)
     ]
-    context = {
+    return {
         'form': form,
         'vehicle': vehicle,
         'unavailable_ranges_json': json.dumps(unavailable_ranges),
-        'crc_is_mandatory': crc_is_mandatory
+        'crc_is_mandatory': crc_is_mandatory,
+        **extra,
     }
-    return render(request, 'book_vehicle.html', context)
 
 
 def _handle_booking_form_submission(request, form, vehicle, is_new_booking=True):
@@ -160,7 +172,8 @@ def _handle_booking_form_submission(request, form, vehicle, is_new_booking=True)
         if resolution:
             if resolution == 'update_existing':
                 client = get_object_or_404(Client, pk=client_id)
-                Client.objects.filter(pk=client_id).update(**form_data)
+                Client.objects.filter(pk=client_id).update(**form_data, updated_at=timezone.now())
+                bookings_cache.invalidate_on_commit()
                 client.refresh_from_db()
             elif resolution == 'create_new':
                 client = Client.objects.create(**form_data)
@@ -198,7 +211,10 @@ def _handle_booking_form_submission(request, form, vehicle, is_new_booking=True)
                 if client_to_silently_update:
                     update_fields = {k: v for k, v in form_data.items() if v and not getattr(client_to_silently_update, k)}
                     if update_fields:
-                        Client.objects.filter(pk=client_to_silently_update.pk).update(**update_fields)
+                        Client.objects.filter(pk=client_to_silently_update.pk).update(
+                            **update_fields, updated_at=timezone.now()
+                        )
+                        bookings_cache.invalidate_on_commit()
                     client = client_to_silently_update
                     client.refresh_from_db()
 
@@ -235,7 +251,19 @@ def _handle_booking_form_submission(request, form, vehicle, is_new_booking=True)
             booking.needs_transport = bool(expected_vehicle_location and s_loc and expected_vehicle_location != s_loc)
             # -------------------------------------------------
 
-            booking.save()
+            try:
+                with transaction.atomic():
+                    booking.save()
+            except IntegrityError as e:
+                if not is_occupancy_conflict(e):
+                    raise
+                # Another request booked the same days between clean() and save().
+                conflict = Booking.objects.overlapping(vehicle, booking.start_date, booking.end_date)
+                if booking.pk:
+                    conflict = conflict.exclude(pk=booking.pk)
+                form.add_error(None, form.conflict_error(conflict.first()))
+                messages.error(request, _('Form is not valid. Please check the errors.'))
+                return (False, render(request, 'book_vehicle.html', _book_vehicle_context(form, vehicle)))
             form.save_m2m()
 
             if previous_status == 'pending_final_km' and booking.final_km is not None:
@@ -259,20 +287,20 @@ def _handle_booking_form_submission(request, form, vehicle, is_new_booking=True)
 
             if is_new_booking:
                 if booking.vehicle.vehicle_type == 'LIGHT':
-                    send_system_notification_task.delay('light_booking_created', context_data=safe_context(ctx))
+                    send_system_notification_task.delay('light_booking_created', context_data=build_notification_envelope(ctx))
                 elif booking.vehicle.vehicle_type == 'HEAVY':
-                    send_system_notification_task.delay('heavy_booking_created', context_data=safe_context(ctx))
+                    send_system_notification_task.delay('heavy_booking_created', context_data=build_notification_envelope(ctx))
                 elif booking.vehicle.vehicle_type == 'APV':
-                    send_system_notification_task.delay('apv_booking_created', context_data=safe_context(ctx))
+                    send_system_notification_task.delay('apv_booking_created', context_data=build_notification_envelope(ctx))
 
                 if booking.needs_transport:
-                    send_system_notification_task.delay('transport_required', context_data=safe_context(ctx))
+                    send_system_notification_task.delay('transport_required', context_data=build_notification_envelope(ctx))
 
                 messages.success(request, _('Your booking request has been submitted successfully!'))
                 return (True, redirect('booking_app:my_bookings'))
             else:
                 if prev_needs_transport is not None and prev_needs_transport != booking.needs_transport:
-                    send_system_notification_task.delay('transport_status_changed', context_data=safe_context(ctx))
+                    send_system_notification_task.delay('transport_status_changed', context_data=build_notification_envelope(ctx))
                 messages.success(request, _('Booking has been updated successfully.'))
                 redirect_url = reverse('booking_app:group_booking_update', kwargs={'booking_pk': form.instance.pk})
                 return (True, redirect(redirect_url))
@@ -323,7 +351,7 @@ def cancel_booking_view(request, booking_pk):
         booking.save()
         Transport.objects.filter(booking=booking).delete()
         ctx = {"booking": booking, "vehicle": booking.vehicle, "user": request.user}
-        send_system_notification_task.delay('booking_canceled_by_user', context_data=safe_context(ctx))
+        send_system_notification_task.delay('booking_canceled_by_user', context_data=build_notification_envelope(ctx))
         messages.success(request, _("Booking cancelled successfully."))
         return redirect('booking_app:my_bookings')
 
@@ -346,17 +374,24 @@ def vehicle_list_view(request, group_name=None):
         sort_by = 'license_plate'
 
     today = date.today()
+    tomorrow = today + timedelta(days=1)
 
-    vehicles_qs = Vehicle.objects.select_related('current_location').filter(active_status=True).prefetch_related(
-        Prefetch(
-            'bookings',
-            queryset=Booking.objects.filter(
-                status__in=['pending', 'pending_contract', 'confirmed', 'pending_final_km'],
-                end_date__gte=today
-            ).order_by('start_date')
-        )
+    vehicles_qs = (
+        Vehicle.objects.select_related('current_location').filter(active_status=True).with_availability(today)
+        # A stored date before tomorrow only means the vehicle is free now.
+        .annotate(next_available=Greatest('next_available_date', Value(tomorrow)))
     )
 
+    # "Free from date X": the vehicle's first free slot covers X.
+    try:
+        available_from = parse_date(request.GET.get('available_from', ''))
+    except ValueError:
+        available_from = None
+    if available_from:
+        vehicles_qs = vehicles_qs.filter(next_available__lte=available_from).filter(
+            Q(current_gap_end__isnull=True) | Q(current_gap_end__gte=available_from)
+        )
+
     all_groups = Group.objects.all().order_by('name')
 
     if not group_name and request.user.is_booking_admin_member:
@@ -366,8 +401,7 @@ def vehicle_list_view(request, group_name=None):
         if group_name:
             effective_group_for_filter = group_name.lower()
         else:
-            for group in request.user.groups.all():
-                gname = group.name.lower()
+            for gname in sorted(name.lower() for name in request.user.group_names):
                 if gname in ['light', 'tllight', 'heavy', 'tlheavy', 'apv', 'tlapv']:
                     effective_group_for_filter = gname
                     break
@@ -382,17 +416,17 @@ def vehicle_list_view(request, group_name=None):
     order_by_field = 'current_location__name' if sort_by == 'current_location' else sort_by
     if direction == 'desc':
         order_by_field = f'-{order_by_field}'
-    vehicles_qs = vehicles_qs.order_by(order_by_field)
+    vehicles_qs = vehicles_qs.order_by(order_by_field, 'license_plate')
 
     paginator = Paginator(vehicles_qs, 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
     for vehicle in page_obj:
-        vehicle.availability_slots = vehicle.get_availability_slots()
+        vehicle.availability_slots = vehicle.get_availability_slots(today)
         vehicle.is_available_now = (
             vehicle.availability_slots and
-            vehicle.availability_slots[0]['start'] <= (today + timedelta(days=1))
+            vehicle.availability_slots[0]['start'] <= tomorrow
         )
 
     context = {
@@ -403,6 +437,7 @@ def vehicle_list_view(request, group_name=None):
         'current_sort': sort_by,
         'current_dir': direction,
         'opposite_dir': 'desc' if direction == 'asc' else 'asc',
+        'available_from': available_from,
     }
     return render(request, 'vehicle_list.html', context)
 
@@ -412,7 +447,7 @@ def vehicle_detail_view(request, pk):
     """
     Show details for a single vehicle including availability slots.
     """
-    vehicle = get_object_or_404(Vehicle, pk=pk)
+    vehicle = get_object_or_404(Vehicle.objects.with_availability(), pk=pk)
     availability_slots = vehicle.get_availability_slots()
     tomorrow = date.today() + timedelta(days=1)
     return render(
@@ -437,7 +472,7 @@ def vehicle_create_view(request):
                 "vehicle": vehicle,
                 "user": request.user,
             }
-            send_system_notification_task.delay('vehicle_created', context_data=safe_context(ctx))
+            send_system_notification_task.delay('vehicle_created', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Vehicle created successfully!"))
             return redirect(reverse('booking_app:admin_vehicle_list'))
         else:
@@ -460,7 +495,7 @@ def vehicle_edit_view(request, pk):
                 "vehicle": vehicle,
                 "user": request.user,
             }
-            send_system_notification_task.delay('vehicle_updated', context_data=safe_context(ctx))
+            send_system_notification_task.delay('vehicle_updated', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Vehicle updated successfully!"))
             return redirect('booking_app:admin_vehicle_list')
         else:
@@ -484,7 +519,7 @@ def vehicle_inactive_view(request, pk):
             "vehicle": vehicle,
             "user": request.user,
         }
-        send_system_notification_task.delay('vehicle_inactive', context_data=safe_context(ctx))
+        send_system_notification_task.delay('vehicle_inactive', context_data=build_notification_envelope(ctx))
 
         messages.success(request, _(f"Vehicle '{vehicle.license_plate}' deactivated successfully!"))
         return redirect('booking_app:admin_vehicle_list')
@@ -500,7 +535,8 @@ def vehicle_inactive_view(request, pk):
 @login_required
 @user_passes_test(lambda u: u.is_booking_admin_member, login_url='booking_app:login_user')
 def admin_vehicle_list_view(request):
-    vehicles = Vehicle.objects.select_related('current_location')
+    today = date.today()
+    vehicles = Vehicle.objects.select_related('current_location').with_availability(today)
 
     # --- Handle filter input via POST ---
     if request.method == "POST":
@@ -537,9 +573,9 @@ def admin_vehicle_list_view(request):
     page_obj = paginator.get_page(page_number)
 
     # annotate each vehicle with availability slot
-    tomorrow = date.today() + timedelta(days=1)
+    tomorrow = today + timedelta(days=1)
     for v in page_obj:
-        slots = v.get_availability_slots()
+        slots = v.get_availability_slots(today)
         v.is_active = v.active_status
         v.is_available_now = False
         v.next_available_start = None
@@ -566,7 +602,7 @@ def admin_vehicle_list_view(request):
 @login_required
 @user_passes_test(lambda u: u.is_booking_admin_member, login_url='booking_app:login_user')
 def admin_vehicle_detail_view(request, pk):
-    vehicle = get_object_or_404(Vehicle, pk=pk)
+    vehicle = get_object_or_404(Vehicle.objects.with_availability(), pk=pk)
     availability_slots = vehicle.get_availability_slots()
     tomorrow = date.today() + timedelta(days=1)
     upcoming_bookings = vehicle.bookings.filter(end_date__gte=date.today()).select_related('user', 'client').order_by('start_date')
@@ -595,7 +631,7 @@ def location_create_view(request):
                 "location": location,
                 "user": request.user,
             }
-            send_system_notification_task.delay('location_created', context_data=safe_context(ctx))
+            send_system_notification_task.delay('location_created', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Location created successfully!"))
             return redirect(reverse('booking_app:admin_location_list'))
     else:
@@ -625,7 +661,7 @@ def location_edit_view(request, pk):
                 "location": location,
                 "user": request.user,
             }
-            send_system_notification_task.delay('location_updated', context_data=safe_context(ctx))
+            send_system_notification_task.delay('location_updated', context_data=build_notification_envelope(ctx))
             messages.success(request, _(f"Location '{location.name}' updated successfully!"))
             return redirect(reverse('booking_app:admin_location_list'))
     else:
@@ -647,7 +683,7 @@ def location_delete_view(request, pk):
             "location": location,
             "user": request.user,
         }
-        send_system_notification_task.delay('location_deleted', context_data=safe_context(ctx))
+        send_system_notification_task.delay('location_deleted', context_data=build_notification_envelope(ctx))
         messages.success(request, _(f"Location '{location.name}' deleted successfully!"))
         return redirect('booking_app:admin_location_list')
 
@@ -679,7 +715,7 @@ def admin_client_create_view(request):
                 "client": client,
                 "user": request.user,
             }
-            send_system_notification_task.delay('client_created', context_data=safe_context(ctx))
+            send_system_notification_task.delay('client_created', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Client created successfully."))
             return redirect('booking_app:admin_client_list')
     else:
@@ -699,7 +735,7 @@ def admin_client_update_view(request, pk):
                 "client": client,
                 "user": request.user,
             }
-            send_system_notification_task.delay('client_updated', context_data=safe_context(ctx))
+            send_system_notification_task.delay('client_updated', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Client updated successfully."))
             return redirect('booking_app:admin_client_list')
     else:
@@ -721,7 +757,7 @@ def admin_client_delete_view(request, pk):
             "client": client,
             "user": request.user,
         }
-        send_system_notification_task.delay('client_deleted', context_data=safe_context(ctx))
+        send_system_notification_task.delay('client_deleted', context_data=build_notification_envelope(ctx))
         messages.success(request, _(f"Client '{client.name}' deleted successfully."))
         return redirect('booking_app:admin_client_list')
 
@@ -753,7 +789,7 @@ def group_create_view(request):
                 "group": group,
                 "user": request.user,
             }
-            send_system_notification_task.delay('group_created', context_data=safe_context(ctx))
+            send_system_notification_task.delay('group_created', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Group created successfully!"))
             return redirect('booking_app:admin_group_list')
     else:
@@ -773,7 +809,7 @@ def group_edit_view(request, pk):
                 "group": group,
                 "user": request.user,
             }
-            send_system_notification_task.delay('group_updated', context_data=safe_context(ctx))
+            send_system_notification_task.delay('group_updated', context_data=build_notification_envelope(ctx))
             messages.success(request, _(f"Group '{group.name}' updated successfully!"))
             return redirect('booking_app:admin_group_list')
     else:
@@ -791,7 +827,7 @@ def group_delete_view(request, pk):
             "group": group,
             "user": request.user,
         }
-        send_system_notification_task.delay('group_deleted', context_data=safe_context(ctx))
+        send_system_notification_task.delay('group_deleted', context_data=build_notification_envelope(ctx))
         messages.success(request, _(f"Group '{group.name}' deleted successfully!"))
         return redirect('booking_app:admin_group_list')
     return render(request, 'admin/admin_group_delete.html', {'group_obj': group})
@@ -810,7 +846,7 @@ def user_create_view(request):
             ctx = {
                 "user": user,
             }
-            send_system_notification_task.delay('user_created', context_data=safe_context(ctx))
+            send_system_notification_task.delay('user_created', context_data=build_notification_envelope(ctx))
             messages.success(request, _(f"User '{user.username}' created successfully."))
             return redirect(reverse('booking_app:admin_user_edit', kwargs={'pk': user.pk}))
     else:
@@ -852,7 +888,7 @@ def user_list_view(request):
                     # Using existing task logic
                     send_system_notification_task.delay(
                         event_trigger='send_user_credentials',
-                        context_data=safe_context(ctx),
+                        context_data=build_notification_envelope(ctx),
                         test_email_recipient=user.email
                     )
                 messages.success(request, _(f"Credentials sent to {count} users."))
@@ -870,7 +906,7 @@ def user_list_view(request):
                     }
                     send_system_notification_task.delay(
                         event_trigger='send_temporary_password',
-                        context_data=safe_context(ctx),
+                        context_data=build_notification_envelope(ctx),
                         test_email_recipient=user.email
                     )
                 messages.success(request, _(f"Password reset sent to {count} users."))
@@ -891,9 +927,9 @@ def user_list_view(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
+    presence = get_presence_map(user.pk for user in page_obj)
     for user in page_obj:
-        user.last_activity = get_last_activity_for_user(user)
-        user.is_logged_in = is_user_logged_in(user)
+        user.is_logged_in, user.last_activity = presence[user.pk]
 
     context = {
         "users": page_obj,
@@ -928,7 +964,7 @@ def user_deactivate_view(request, pk):
             "user": user_to_deactivate,
             "performed_by": request.user
         }
-        send_system_notification_task.delay('user_deactivated', context_data=safe_context(ctx))
+        send_system_notification_task.delay('user_deactivated', context_data=build_notification_envelope(ctx))
         messages.success(request, _(f"User '{user_to_deactivate.username}' has been deactivated."))
         return redirect('booking_app:admin_user_list')
 
@@ -946,7 +982,7 @@ def user_reactivate_view(request, pk):
             "user": user_to_reactivate,
             "performed_by": request.user
         }
-        send_system_notification_task.delay('user_reactivated', context_data=safe_context(ctx))
+        send_system_notification_task.delay('user_reactivated', context_data=build_notification_envelope(ctx))
         messages.success(request, _(f"User '{user_to_reactivate.username}' has been reactivated."))
     return redirect('booking_app:admin_inactive_user_list')
 
@@ -963,7 +999,7 @@ def admin_user_edit_view(request, pk):
                 "user": user_to_edit,
                 "performed_by": request.user,
             }
-            send_system_notification_task.delay('user_updated', context_data=safe_context(ctx))
+            send_system_notification_task.delay('user_updated', context_data=build_notification_envelope(ctx))
             messages.success(request, _(f"User '{user_to_edit.username}' updated successfully!"))
             return redirect(
                 'booking_app:admin_user_list' if user_to_edit.is_active else 'booking_app:admin_inactive_user_list'
@@ -982,7 +1018,13 @@ def admin_user_edit_view(request, pk):
 def admin_user_sessions_view(request, pk):
     user = get_object_or_404(User, pk=pk)
     sessions = get_user_sessions(user)
-    return render(request, "admin/admin_user_sessions.html", {"user_to_edit": user, "sessions": sessions})
+    is_online, last_activity = get_presence_map([user.pk])[user.pk]
+    return render(request, "admin/admin_user_sessions.html", {
+        "user_to_edit": user,
+        "sessions": sessions,
+        "is_online": is_online,
+        "last_activity": last_activity,
+    })
 
 
 @login_required
@@ -994,7 +1036,7 @@ def admin_kill_user_sessions(request, pk):
         "user": user,
         "performed_by": request.user,
     }
-    send_system_notification_task.delay('user_sessions_terminated', context_data=safe_context(ctx))
+    send_system_notification_task.delay('user_sessions_terminated', context_data=build_notification_envelope(ctx))
     messages.success(request, f"All sessions for {user.username} were terminated.")
     return redirect("booking_app:admin_user_edit", pk=user.pk)
 
@@ -1006,7 +1048,7 @@ def admin_kill_all_sessions(request):
     ctx = {
         "performed_by": request.user,
     }
-    send_system_notification_task.delay('all_sessions_terminated', context_data=safe_context(ctx))
+    send_system_notification_task.delay('all_sessions_terminated', context_data=build_notification_envelope(ctx))
     messages.success(request, "All user sessions were terminated.")
     return redirect("booking_app:admin_user_list")
 
@@ -1020,7 +1062,7 @@ def admin_kill_session(request, pk, session_key):
         "user": user,
         "performed_by": request.user,
     }
-    send_system_notification_task.delay('user_session_terminated', context_data=safe_context(ctx))
+    send_system_notification_task.delay('user_session_terminated', context_data=build_notification_envelope(ctx))
     messages.success(request, _("Session terminated."))
     return redirect("booking_app:admin_user_sessions", pk=user.pk)
 
@@ -1044,7 +1086,7 @@ def admin_user_reset_password_view(request, pk):
             }
             send_system_notification_task.delay(
                 event_trigger='password_reset',
-                context_data=safe_context(ctx)
+                context_data=build_notification_envelope(ctx)
             )
             messages.success(request, _(f"Password for user '{user_to_reset.username}' has been reset successfully!"))
             return redirect('booking_app:admin_user_edit', pk=user_to_reset.pk)
@@ -1068,7 +1110,7 @@ def send_credentials_view(request, pk):
     }
     send_system_notification_task.delay(
         event_trigger='send_user_credentials',
-        context_data=safe_context(ctx),
+        context_data=build_notification_envelope(ctx),
         test_email_recipient=user_to_notify.email
     )
     messages.success(request, _(f"Login credentials sent to {user_to_notify.email}."))
@@ -1089,7 +1131,7 @@ def send_temporary_password_view(request, pk):
     }
     send_system_notification_task.delay(
         event_trigger='send_temporary_password',
-        context_data=safe_context(ctx),
+        context_data=build_notification_envelope(ctx),
         test_email_recipient=user_to_reset.email
     )
     messages.success(request, _(f"A temporary password was sent to {user_to_reset.email}."))
@@ -1202,7 +1244,7 @@ def admin_dl_form_view(request, pk=None):
                 "distribution_list": dl,
                 "user": request.user,
             }
-            send_system_notification_task.delay(event, context_data=safe_context(ctx))
+            send_system_notification_task.delay(event, context_data=build_notification_envelope(ctx))
             messages.success(request, _("Distribution list saved successfully!"))
             return redirect('booking_app:admin_dl_list')
     else:
@@ -1220,7 +1262,7 @@ def admin_dl_delete_view(request, pk):
             "distribution_list": dl,
             "user": request.user,
         }
-        send_system_notification_task.delay('distribution_list_deleted', context_data=safe_context(ctx))
+        send_system_notification_task.delay('distribution_list_deleted', context_data=build_notification_envelope(ctx))
         messages.success(request, _("Distribution list deleted successfully!"))
         return redirect('booking_app:admin_dl_list')
     return render(request, 'admin/admin_dl_confirm_delete.html', {'distribution_list': dl})
@@ -1242,7 +1284,7 @@ def automation_settings_view(request):
                 "settings": settings_instance,
                 "user": request.user
             }
-            send_system_notification_task.delay('automation_settings_updated', context_data=safe_context(ctx))
+            send_system_notification_task.delay('automation_settings_updated', context_data=build_notification_envelope(ctx))
             messages.success(request, _("Automation settings updated successfully."))
             return redirect('booking_app:automation_settings')
     else:
@@ -1356,40 +1398,157 @@ def validate_vat_view(request):
 # API Views
 # ------------------------------
 
-@login_required
-def my_bookings_api_view(request):
-    user_bookings = Booking.objects.filter(
+# Longest window a calendar feed will serve in one request.
+MAX_CALENDAR_WINDOW_DAYS = 366
+
+CALENDAR_EVENT_FIELDS = ('pk', 'start_date', 'end_date', 'vehicle__license_plate', 'vehicle__vehicle_type', 'client__name')
+
+
+def _calendar_window(request):
+    """
+    The visible [start, end) window sent by the calendar widget as ?start=&end=
+    (ISO dates). Defaults to the current month padded by a week on each side.
+    """
+    try:
+        start = parse_date(request.GET.get('start', ''))
+        end = parse_date(request.GET.get('end', ''))
+    except ValueError:
+        start = end = None
+    if not start:
+        start = date.today().replace(day=1) - timedelta(days=7)
+    if not end or end <= start:
+        end = start + timedelta(days=45)
+    return start, min(end, start + timedelta(days=MAX_CALENDAR_WINDOW_DAYS))
+
+
+def _calendar_rows(bookings, start, end):
+    """Bookings overlapping [start, end), reduced to the columns a calendar event needs."""
+    return (
+        bookings
+        .filter(end_date__gte=start, start_date__lt=end)
+        .order_by('start_date', 'pk')
+        .values(*CALENDAR_EVENT_FIELDS)
+    )
+
+
+def _calendar_json(data):
+    response = JsonResponse(data, safe=False, json_dumps_params={'separators': (',', ':')})
+    # Let the browser keep the feed but revalidate it (If-None-Match) on every fetch.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _my_bookings_scope(request):
+    return Booking.objects.filter(
         user=request.user,
         status__in=['pending', 'pending_contract', 'confirmed', 'on_going', 'pending_final_km']
-    ).select_related('vehicle', 'client')
+    )
+
+
+def _all_bookings_scope(request):
+    return Booking.objects.filter(status__in=['pending', 'pending_contract', 'confirmed', 'pending_final_km'])
+
+
+def _group_calendar_scope(request):
+    return Booking.objects.filter(
+        vehicle__vehicle_type__in=get_managed_vehicle_types(request.user),
+        status__in=['pending', 'pending_contract', 'confirmed', 'on_going', 'pending_final_km']
+    )
+
+
+def _compute_feed_version(request, scope, start, end, key):
+    version = scope(request).filter(end_date__gte=start, start_date__lt=end).aggregate(
+        count=Count('pk'),
+        booking_modified=Max('updated_at'),
+        vehicle_modified=Max('vehicle__updated_at'),
+        client_modified=Max('client__updated_at'),
+    )
+    markers = [version[name] for name in ('booking_modified', 'vehicle_modified', 'client_modified')]
+    last_modified = max((marker for marker in markers if marker), default=None)
+    key = '|'.join([key, str(version['count']), *(marker.isoformat() if marker else '' for marker in markers)])
+    return hashlib.sha256(key.encode()).hexdigest(), last_modified
+
+
+def _feed_version(request, scope):
+    """
+    (etag, last_modified) of a windowed feed, from one Max(updated_at)/Count query
+    over the bookings and the vehicles and clients they render. The count catches
+    deletions and bookings leaving the scope; memoised on the request because
+    condition() asks for the ETag and Last-Modified separately, and kept in the
+    'bookings' cache namespace, which every booking, vehicle and client change
+    invalidates, so polls of an unchanged calendar run no query at all.
+    """
+    if not hasattr(request, '_feed_version'):
+        start, end = _calendar_window(request)
+        key = '|'.join(str(part) for part in (
+            request.path, request.user.pk, ','.join(sorted(request.user.group_names)),
+            get_language(), start, end,
+        ))
+        request._feed_version = bookings_cache.get_or_set(
+            f"feed_version:{hashlib.sha256(key.encode()).hexdigest()}",
+            lambda: _compute_feed_version(request, scope, start, end, key),
+        )
+    return request._feed_version
+
+
+def booking_feed_condition(scope):
+    """Answer conditional GETs on a booking feed with 304 before the feed query runs."""
+    return condition(
+        etag_func=lambda request, *args, **kwargs: _feed_version(request, scope)[0],
+        last_modified_func=lambda request, *args, **kwargs: _feed_version(request, scope)[1],
+    )
+
+
+@login_required
+@booking_feed_condition(_my_bookings_scope)
+def my_bookings_api_view(request):
+    start, end = _calendar_window(request)
+    user_bookings = _calendar_rows(_my_bookings_scope(request), start, end)
 
     events = []
-    for booking in user_bookings:
-        client_name = booking.client.name if booking.client else _("N/A")
+    for row in user_bookings:
+        client_name = row['client__name'] or _("N/A")
         events.append({
-            'id': booking.pk,
-            'text': f"{booking.vehicle.license_plate} - {client_name}",
-            'start': booking.start_date.isoformat(),
-            'end': (booking.end_date + timedelta(days=1)).isoformat(),
-            'url': reverse('booking_app:booking_detail', kwargs={'booking_pk': booking.pk}),
-            'backColor': {'LIGHT': '#3c78d8', 'HEAVY': '#cc0000', 'APV': '#6aa84f'}.get(booking.vehicle.vehicle_type, '#dddddd'),
+            'id': row['pk'],
+            'text': f"{row['vehicle__license_plate']} - {client_name}",
+            'start': row['start_date'].isoformat(),
+            'end': (row['end_date'] + timedelta(days=1)).isoformat(),
+            'url': reverse('booking_app:booking_detail', kwargs={'booking_pk': row['pk']}),
+            'backColor': {'LIGHT': '#3c78d8', 'HEAVY': '#cc0000', 'APV': '#6aa84f'}.get(row['vehicle__vehicle_type'], '#dddddd'),
         })
-    return JsonResponse(events, safe=False)
+    return _calendar_json(events)
 
 
 @login_required
+@user_passes_test(is_group_leader, login_url='booking_app:home')
+def fleet_occupancy_api_view(request):
+    """Free vehicles per day and type over the occupancy horizon, for the fleet heatmap."""
+    try:
+        days = max(1, min(int(request.GET.get('days', HORIZON_DAYS)), HORIZON_DAYS))
+        run_length = int(request.GET.get('run', 0))
+    except ValueError:
+        return JsonResponse({'error': _('Invalid number of days.')}, status=400)
+
+    vehicle_types = sorted(get_managed_vehicle_types(request.user))
+    occupancy = FleetOccupancy.load(vehicle_types)
+    return JsonResponse(occupancy.heatmap(vehicle_types, days=days, run_length=run_length))
+
+
+@login_required
+@booking_feed_condition(_all_bookings_scope)
 def booking_api_view(request):
-    all_bookings = Booking.objects.filter(status__in=['pending', 'pending_contract', 'confirmed', 'pending_final_km']).select_related('vehicle', 'client')
+    start, end = _calendar_window(request)
+    all_bookings = _calendar_rows(_all_bookings_scope(request), start, end)
     event_list = []
-    for booking in all_bookings:
-        client_name = booking.client.name if booking.client else _("N/A")
+    for row in all_bookings:
+        client_name = row['client__name'] or _("N/A")
         event_list.append({
-            "id": booking.pk,
-            "text": f"{booking.vehicle.license_plate} - {client_name}",
-            "start": booking.start_date.isoformat(),
-            "end": (booking.end_date + timedelta(days=1)).isoformat(),
+            "id": row['pk'],
+            "text": f"{row['vehicle__license_plate']} - {client_name}",
+            "start": row['start_date'].isoformat(),
+            "end": (row['end_date'] + timedelta(days=1)).isoformat(),
         })
-    return JsonResponse(event_list, safe=False)
+    return _calendar_json(event_list)
 
 # --- User's Personal Views ---
 
@@ -1468,7 +1627,9 @@ def change_password_view(request):
         form = PasswordChangeForm(request.user, request.POST)
         if form.is_valid():
             user = form.save()
-            update_session_auth_hash(request, user)
+            old_session_key = request.session.session_key
+            update_session_auth_hash(request, user)  # cycles the session key
+            rotate_session(request, old_session_key)
             messages.success(request, _('Your password was successfully updated!'))
             return redirect('booking_app:my_account')
     else:
@@ -1544,7 +1705,7 @@ def group_booking_update_view(request, booking_pk):
                 ctx = {
                     "booking": booking,
                 }
-                send_system_notification_task.delay('booking_approved', context_data=safe_context(ctx))
+                send_system_notification_task.delay('booking_approved', context_data=build_notification_envelope(ctx))
                 messages.success(request, _("Booking has been approved."))
             return redirect('booking_app:group_booking_detail', booking_pk=booking.pk)
         elif action == 'approve_apv':
@@ -1556,7 +1717,7 @@ def group_booking_update_view(request, booking_pk):
                 ctx = {
                     "booking": booking,
                 }
-                send_system_notification_task.delay('apv_booking_approved', context_data=safe_context(ctx))
+                send_system_notification_task.delay('apv_booking_approved', context_data=build_notification_envelope(ctx))
                 messages.success(request, _("APV booking has been approved."))
             return redirect('booking_app:group_booking_detail', booking_pk=booking.pk)
         elif action == 'cancel_by_manager':
@@ -1569,7 +1730,7 @@ def group_booking_update_view(request, booking_pk):
                     "booking": booking,
                 }
                 booking.save(update_fields=['status','cancellation_reason','cancellation_time','cancelled_by'])
-                send_system_notification_task.delay('booking_canceled_by_manager', context_data=safe_context(ctx))
+                send_system_notification_task.delay('booking_canceled_by_manager', context_data=build_notification_envelope(ctx))
                 messages.success(request, _("Booking has been cancelled."))
             return redirect('booking_app:group_dashboard')
         elif action == 'request_final_km':
@@ -1583,7 +1744,7 @@ def group_booking_update_view(request, booking_pk):
                     "booking": booking,
                 }
                 booking.save(update_fields=update_fields)
-                send_system_notification_task.delay('booking_ended_pending_km', context_data=safe_context(ctx))
+                send_system_notification_task.delay('booking_ended_pending_km', context_data=build_notification_envelope(ctx))
                 messages.info(request, _("Final KM request has been sent."))
             return redirect('booking_app:group_booking_detail', booking_pk=booking.pk)
         form = BookingForm(request.POST, request.FILES, instance=booking, vehicle=booking.vehicle)
@@ -1696,6 +1857,7 @@ def import_vehicles_view(request):
 
                 vehicles_to_create = []
                 errors = []
+                today = date.today()
 
                 for i, row in enumerate(reader, start=2):
                     license_plate = row.get('license_plate')
@@ -1745,7 +1907,13 @@ def import_vehicles_view(request):
                         else:
                             vehicle_data['picture'] = 'Default/no_image.png'
 
-                    vehicles_to_create.append(Vehicle(**vehicle_data))
+                    # bulk_create skips the save signals, so seed the denormalised availability here.
+                    vehicle = Vehicle(**vehicle_data)
+                    first_slot = compute_availability_slots(vehicle, [], today)[0]
+                    vehicle.next_available_date = first_slot['start']
+                    vehicle.current_gap_end = first_slot['end']
+
+                    vehicles_to_create.append(vehicle)
 
                 if errors:
                     # Raise validation error to be caught below and shown as a list
@@ -1821,56 +1989,132 @@ def group_reports_view(request):
 @login_required
 @user_passes_test(is_group_leader, login_url='booking_app:home')
 def group_calendar_view(request):
-    vehicle_types_to_manage = get_managed_vehicle_types(request.user)
-    calendar_bookings = (
-        Booking.objects
-        .filter(
-            vehicle__vehicle_type__in=vehicle_types_to_manage,
-            status__in=['pending', 'pending_contract', 'confirmed', 'on_going', 'pending_final_km']
-        )
-        .select_related('vehicle', 'client')
-    )
+    context = {
+        'page_title': _("Group Bookings Calendar"),
+    }
+    return render(request, 'group_calendar.html', context)
 
-    unique_vehicles = {b.vehicle for b in calendar_bookings}
-    colors = [
-        '#e6194b', '#3cb44b', '#ffe119', '#4363d8', '#f58231', '#911eb4', '#46f0f0', '#f032e6', '#bcf60c',
-        '#fabebe', '#008080', '#e6beff', '#9a6324', '#fffac8', '#800000', '#aaffc3', '#808000', '#ffd8b1',
-        '#000075', '#808080'
-    ]
+
+GROUP_CALENDAR_COLORS = [
+    '#e6194b', '#3cb44b', '#ffe119', '#4363d8', '#f58231', '#911eb4', '#46f0f0', '#f032e6', '#bcf60c',
+    '#fabebe', '#008080', '#e6beff', '#9a6324', '#fffac8', '#800000', '#aaffc3', '#808000', '#ffd8b1',
+    '#000075', '#808080'
+]
+
+
+@login_required
+@user_passes_test(is_group_leader, login_url='booking_app:home')
+@booking_feed_condition(_group_calendar_scope)
+def group_calendar_api_view(request):
+    """Events and colour legend of the managed vehicle types for the visible window."""
+    start, end = _calendar_window(request)
+    calendar_bookings = list(_calendar_rows(_group_calendar_scope(request), start, end))
+
+    unique_plates = sorted({row['vehicle__license_plate'] for row in calendar_bookings})
     license_plate_color_map = {
-        v.license_plate: colors[i % len(colors)]
-        for i, v in enumerate(sorted(unique_vehicles, key=lambda vv: vv.license_plate))
+        plate: GROUP_CALENDAR_COLORS[i % len(GROUP_CALENDAR_COLORS)]
+        for i, plate in enumerate(unique_plates)
     }
 
     calendar_events = []
-    for booking in calendar_bookings:
-        client_name = booking.client.name if booking.client else "N/A"
+    for row in calendar_bookings:
+        client_name = row['client__name'] or "N/A"
         calendar_events.append({
-            'id': booking.pk,
-            'text': f"{booking.vehicle.license_plate} - {client_name}",
-            'start': booking.start_date.isoformat(),
-            'end': (booking.end_date + timedelta(days=1)).isoformat(),  # dayPilot-like end exclusive
-            'url': reverse('booking_app:group_booking_detail', kwargs={'booking_pk': booking.pk}),
-            'backColor': license_plate_color_map.get(booking.vehicle.license_plate, '#dddddd'),
+            'id': row['pk'],
+            'text': f"{row['vehicle__license_plate']} - {client_name}",
+            'start': row['start_date'].isoformat(),
+            'end': (row['end_date'] + timedelta(days=1)).isoformat(),  # dayPilot-like end exclusive
+            'url': reverse('booking_app:group_booking_detail', kwargs={'booking_pk': row['pk']}),
+            'backColor': license_plate_color_map.get(row['vehicle__license_plate'], '#dddddd'),
         })
 
-    context = {
-        'page_title': _("Group Bookings Calendar"),
-        'calendar_events': json.dumps(calendar_events),
-        'color_legend': license_plate_color_map,
-    }
-    return render(request, 'group_calendar.html', context)
+    return _calendar_json({'events': calendar_events, 'legend': license_plate_color_map})
 
 
 # ------------------------------
 # Email Logs
 # ------------------------------
 
+EMAIL_LOG_PAGE_SIZE = 25
+
+
+def _log_cursor(log):
+    return f"{log.sent_at.isoformat()}_{log.pk}"
+
+
+def _parse_log_cursor(value):
+    """(sent_at, pk) from a cursor produced by _log_cursor, or None."""
+    try:
+        sent_at, pk = value.rsplit('_', 1)
+        return datetime.fromisoformat(sent_at), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _parse_date_param(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
 @login_required
 @user_passes_test(is_booking_manager, login_url='booking_app:login_user')
 def email_log_list_view(request):
-    log_list = EmailLog.objects.all().order_by('-sent_at')
-    paginator = Paginator(log_list, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return render(request, 'admin/admin_email_log_list.html', {'page_obj': page_obj, 'page_title': _("Email Logs")})
+    """
+    Newest-first email log with keyset pagination: pages are addressed by the
+    (sent_at, id) of their boundary row instead of an OFFSET, and no total is
+    counted, so every page costs the same however large the table grows.
+    """
+    filters = {
+        'recipient': request.GET.get('recipient', '').strip(),
+        'status': request.GET.get('status', ''),
+        'date_from': request.GET.get('date_from', ''),
+        'date_to': request.GET.get('date_to', ''),
+    }
+    log_list = EmailLog.objects.all()
+    if filters['recipient']:
+        log_list = log_list.filter(recipient__istartswith=filters['recipient'])
+    if filters['status'] in dict(EmailLog.STATUS_CHOICES):
+        log_list = log_list.filter(status=filters['status'])
+    date_from, date_to = _parse_date_param(filters['date_from']), _parse_date_param(filters['date_to'])
+    if date_from:
+        log_list = log_list.filter(sent_at__gte=_start_of_day(date_from))
+    if date_to:
+        log_list = log_list.filter(sent_at__lt=_start_of_day(date_to + timedelta(days=1)))
+
+    older_than = _parse_log_cursor(request.GET.get('after'))
+    newer_than = _parse_log_cursor(request.GET.get('before'))
+    if newer_than:
+        sent_at, pk = newer_than
+        rows = list(
+            log_list.filter(Q(sent_at__gt=sent_at) | Q(sent_at=sent_at, pk__gt=pk))
+            .order_by('sent_at', 'pk')[:EMAIL_LOG_PAGE_SIZE + 1]
+        )
+        has_newer = len(rows) > EMAIL_LOG_PAGE_SIZE
+        logs = rows[:EMAIL_LOG_PAGE_SIZE][::-1]
+        has_older = True
+    else:
+        if older_than:
+            sent_at, pk = older_than
+            log_list = log_list.filter(Q(sent_at__lt=sent_at) | Q(sent_at=sent_at, pk__lt=pk))
+        rows = list(log_list.order_by('-sent_at', '-pk')[:EMAIL_LOG_PAGE_SIZE + 1])
+        has_older = len(rows) > EMAIL_LOG_PAGE_SIZE
+        logs = rows[:EMAIL_LOG_PAGE_SIZE]
+        has_newer = older_than is not None
+
+    filter_query = urlencode({key: value for key, value in filters.items() if value})
+    context = {
+        'logs': logs,
+        'filters': filters,
+        'status_choices': EmailLog.STATUS_CHOICES,
+        'filter_query': filter_query,
+        'newer_cursor': _log_cursor(logs[0]) if logs and has_newer else None,
+        'older_cursor': _log_cursor(logs[-1]) if logs and has_older else None,
+        'page_title': _("Email Logs"),
+    }
+    return render(request, 'admin/admin_email_log_list.html', context)
@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.humanize',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework_simplejwt',
     'booking_app',
@@ -110,6 +111,14 @@ DATABASES = {
     }
 }
 
+# Shared by all web and worker processes (license status, recipients, occupancy rows, ...).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/2'),  # Redis DB 2
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -151,6 +160,11 @@ LOCALE_PATHS = [
     BASE_DIR / 'locale',
 ]
 
+# Business-day calendar used for the booking buffers (see booking_app/business_calendar.py).
+# National holidays of BUSINESS_CALENDAR_COUNTRY plus company closing days (ISO dates).
+BUSINESS_CALENDAR_COUNTRY = 'PT'
+BUSINESS_CALENDAR_EXTRA_HOLIDAYS = []
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
 
@@ -248,10 +262,32 @@ MS_GRAPH_CLIENT_SECRET = os.environ.get('MS_GRAPH_CLIENT_SECRET')
 
 # The "From" address must be the same user account that you granted Mail.Send permissions to in Azure
 MS_GRAPH_SENDER_EMAIL = os.environ.get('MS_GRAPH_SENDER_EMAIL')
+# Share one Graph access token between all workers through the Django cache.
+MS_GRAPH_SHARED_TOKEN_CACHE = True
+
+# Email outbox: attempts before a message is dead-lettered, and the first retry delay (doubled each time).
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+EMAIL_OUTBOX_BACKOFF_SECONDS = 60
+
+# EmailLog monthly partitions (see booking_app/partitions.py): months created ahead,
+# months kept online, and where expired months are archived as gzipped JSONL.
+EMAIL_LOG_PARTITIONS_AHEAD = 3
+EMAIL_LOG_RETENTION_MONTHS = 12
+EMAIL_LOG_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archive', 'email_logs')
 
 LICENSE_KEY = os.getenv('LICENSE_KEY')
 LICENSE_SERVER_URL = os.getenv('LICENSE_SERVER_URL')
 INSTANCE_ID = os.getenv('INSTANCE_ID')
+# License status cache (booking_app.utils.get_license_status): seconds a status is
+# considered fresh, how long before that it is refreshed in the background, the
+# retry interval while the server is unreachable, how long the last good status
+# is served meanwhile, and how long requests are let through before any status
+# has been obtained.
+LICENSE_STATUS_TTL = 3600
+LICENSE_REFRESH_AHEAD = 300
+LICENSE_RETRY_INTERVAL = 60
+LICENSE_GRACE_PERIOD = 24 * 60 * 60
+LICENSE_PENDING_PERIOD = 5 * 60
 
 # Let Django know it's behind an SSL-offloading proxy
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -263,6 +299,8 @@ USE_X_FORWARDED_HOST = True
 # Sessions expire after 1 day (in seconds)
 SESSION_COOKIE_AGE = 86400
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
+# Seconds between two writes of a session's last_activity (SessionActivityMiddleware).
+SESSION_ACTIVITY_WRITE_INTERVAL = 60
 
 # Set default input/output formats
 DATE_FORMAT = "d/m/Y"           # How Django displays dates
@@ -308,7 +346,79 @@ LOGGING = {
 }
 
 # Celery + Redis
+from celery.schedules import crontab
+
 CELERY_BROKER_URL = "redis://localhost:6379/0"   # Redis DB 0
 CELERY_RESULT_BACKEND = "redis://localhost:6379/1"  # Redis DB 1
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    # Retries and anything queued while no worker was listening.
+    'dispatch-email-outbox': {
+        'task': 'booking_app.tasks.dispatch_email_outbox_task',
+        'schedule': 60.0,
+    },
+    # Jobs of booking_app.periodic. Each tick runs the job only once it is due and
+    # not yet done for the current period, so missed runs are caught up.
+    'update-ended-bookings': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('update-ended-bookings',),
+    },
+    'update-ongoing-bookings': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('update-ongoing-bookings',),
+    },
+    'deactivate-expired-vehicles': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('deactivate-expired-vehicles',),
+    },
+    'refresh-vehicle-availability': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('refresh-vehicle-availability',),
+    },
+    'check-pending-bookings': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('check-pending-bookings',),
+    },
+    'send-booking-reminders': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('send-booking-reminders',),
+    },
+    'weekly-transports-digest': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('weekly-transports-digest',),
+    },
+    'purge-expired-sessions': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('purge-expired-sessions',),
+    },
+    'daily-error-report': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('daily-error-report',),
+    },
+    'maintain-email-log-partitions': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('maintain-email-log-partitions',),
+    },
+    'refresh-license-status': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('refresh-license-status',),
+    },
+    'prune-periodic-job-runs': {
+        'task': 'booking_app.tasks.run_periodic_job_task',
+        'schedule': crontab(minute='*/5'),
+        'args': ('prune-periodic-job-runs',),
+    },
+}
+# Redis used for the periodic job locks.
+PERIODIC_JOBS_REDIS_URL = CELERY_BROKER_URL
 CELERY_TIMEZONE = "Europe/Lisbon"